@@ -0,0 +1,95 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from character_manager import CLASS_STATS, create_character
+
+
+# Synthetic content shaped like data/quests.txt and data/items.txt, at any
+# size. Everything is seeded so two runs time the same data.
+
+QUEST_BLOCK = (
+    "QUEST_ID: {quest_id}\n"
+    "TITLE: Quest {n}\n"
+    "DESCRIPTION: Generated quest number {n} for benchmarking.\n"
+    "REWARD_XP: {xp}\n"
+    "REWARD_GOLD: {gold}\n"
+    "REQUIRED_LEVEL: {level}\n"
+    "PREREQUISITE: {prereq}\n"
+)
+
+ITEM_BLOCK = (
+    "ITEM_ID: {item_id}\n"
+    "NAME: Item {n}\n"
+    "TYPE: {type}\n"
+    "EFFECT: {effect}\n"
+    "COST: {cost}\n"
+    "DESCRIPTION: Generated item number {n} for benchmarking.\n"
+)
+
+ITEM_KINDS = (
+    ("consumable", "health:{v}"),
+    ("weapon", "strength:{v}"),
+    ("armor", "max_health:{v}"),
+)
+
+
+def quest_id(n):
+    return "quest_%d" % n
+
+
+def item_id(n):
+    return "item_%d" % n
+
+
+def write_quests(path, count, seed=1):
+    # Quests form a forest: every tenth quest is a root, the rest need an
+    # earlier quest. Required levels grow along the chains.
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for n in range(count):
+            if n % 10 == 0:
+                prereq = "NONE"
+                level = 1
+            else:
+                parent = rng.randrange(max(0, n - 50), n)
+                prereq = quest_id(parent)
+                level = 1 + (n % 30)
+            f.write(QUEST_BLOCK.format(
+                quest_id=quest_id(n), n=n, xp=rng.randint(10, 500),
+                gold=rng.randint(5, 200), level=level, prereq=prereq,
+            ))
+            f.write("\n")
+    return path
+
+
+def write_items(path, count, seed=2):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for n in range(count):
+            kind, effect = ITEM_KINDS[n % len(ITEM_KINDS)]
+            f.write(ITEM_BLOCK.format(
+                item_id=item_id(n), n=n, type=kind,
+                effect=effect.format(v=rng.randint(1, 50)),
+                cost=rng.randint(1, 500),
+            ))
+            f.write("\n")
+    return path
+
+
+def make_characters(count, seed=3):
+    # Characters of every class with some progress, gold and items.
+    rng = random.Random(seed)
+    classes = sorted(CLASS_STATS)
+    characters = []
+    for n in range(count):
+        character = create_character("bench_%d" % n, classes[n % len(classes)])
+        character["level"] = rng.randint(1, 30)
+        character["gold"] = rng.randint(0, 10000)
+        character["health"] = rng.randint(1, character["max_health"])
+        character["inventory"] = [item_id(rng.randrange(100)) for _ in range(5)]
+        character["completed_quests"] = [quest_id(i * 10) for i in range(3)]
+        characters.append(character)
+    return characters
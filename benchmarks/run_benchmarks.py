@@ -0,0 +1,512 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import character_manager
+import combat_system
+import game_data
+import inventory_system
+import quest_handler
+import datagen
+
+
+# Benchmarks for the hot paths: content parsing, save formats, saves,
+# inventory, quests and combat. Run from the project folder:
+#
+#   python benchmarks/run_benchmarks.py --scale small
+#   python benchmarks/run_benchmarks.py --scale small --compare old.json
+#
+# Each sample calls a benchmark enough times to last at least 0.2s
+# (timeit's autorange), and --repeat samples are taken. Every sample is
+# paired with a sample of a fixed reference workload, and the median
+# benchmark/reference ratio is what gets compared, so the whole machine
+# being faster or slower between two runs cancels out.
+#
+# Results are written as JSON. With --compare, a benchmark fails the run
+# (exit status 1) when its ratio is worse than the baseline's by more
+# than --tolerance, or by more than NOISE_FACTOR times the larger spread
+# (interquartile range / median) of the two runs if that is bigger.
+
+NOISE_FACTOR = 2
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# records: quests and items in the generated files
+# characters: saved characters and batch sizes
+# inventory: items in the large-inventory benchmarks
+# battle_health: enemy health in the long battle (one turn per point)
+SCALES = {
+    "small": {"records": 10 ** 3, "characters": 10 ** 3,
+              "inventory": 10 ** 3, "battle_health": 10 ** 4},
+    "medium": {"records": 10 ** 4, "characters": 10 ** 4,
+               "inventory": 10 ** 4, "battle_health": 10 ** 5},
+    "large": {"records": 10 ** 5, "characters": 10 ** 5,
+              "inventory": 10 ** 5, "battle_health": 10 ** 6},
+    "huge": {"records": 10 ** 6, "characters": 10 ** 5,
+             "inventory": 10 ** 5, "battle_health": 10 ** 6},
+}
+
+# name -> setup(ctx) returning (run, ops); run() is what gets timed and
+# ops is how many operations one run performs.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class Context:
+    # Generated files and characters, shared by the benchmarks of one run.
+
+    def __init__(self, scale, workdir):
+        self.scale = scale
+        self.workdir = workdir
+        self._cache = {}
+
+    def _get(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def quest_file(self):
+        return self._get("quest_file", lambda: datagen.write_quests(
+            os.path.join(self.workdir, "quests.txt"), self.scale["records"]))
+
+    def item_file(self):
+        return self._get("item_file", lambda: datagen.write_items(
+            os.path.join(self.workdir, "items.txt"), self.scale["records"]))
+
+    def quests(self):
+        return self._get("quests", lambda: game_data.load_quests(
+            self.quest_file(), use_cache=False))
+
+    def items(self):
+        return self._get("items", lambda: game_data.load_items(
+            self.item_file(), use_cache=False))
+
+    def characters(self):
+        return self._get("characters", lambda: datagen.make_characters(
+            self.scale["characters"]))
+
+    def saved_names(self):
+        def build():
+            character_manager.save_characters(self.characters())
+            return [c["name"] for c in self.characters()]
+        return self._get("saved_names", build)
+
+
+# ---------------- PARSING ----------------
+
+@benchmark("load_quests")
+def _load_quests(ctx):
+    path = ctx.quest_file()
+    return (lambda: game_data.load_quests(path, use_cache=False),
+            ctx.scale["records"])
+
+
+@benchmark("load_quests_cached")
+def _load_quests_cached(ctx):
+    path = ctx.quest_file()
+    game_data.load_quests(path)
+    return lambda: game_data.load_quests(path), ctx.scale["records"]
+
+
+@benchmark("load_items")
+def _load_items(ctx):
+    path = ctx.item_file()
+    return (lambda: game_data.load_items(path, use_cache=False),
+            ctx.scale["records"])
+
+
+# ---------------- SAVES ----------------
+
+@benchmark("save_character")
+def _save_character(ctx):
+    characters = ctx.characters()
+
+    def run():
+        for character in characters:
+            character_manager.save_character(character)
+    return run, len(characters)
+
+
+@benchmark("save_characters_batch")
+def _save_characters_batch(ctx):
+    characters = ctx.characters()
+    return lambda: character_manager.save_characters(characters), len(characters)
+
+
+@benchmark("load_character")
+def _load_character(ctx):
+    names = ctx.saved_names()
+
+    def run():
+        for name in names:
+            character_manager.load_character(name)
+    return run, len(names)
+
+
+# ---------------- SAVE FORMATS ----------------
+
+# Encode and decode only, no storage. "legacy" is the old str(dict) save
+# read back with eval (decode_legacy: the literal_eval path that still
+# reads those files).
+
+def _plain_characters(ctx):
+    return [
+        {k: list(v) if k in character_manager.CHARACTER_LIST_FIELDS else v
+         for k, v in c.items()}
+        for c in ctx.characters()
+    ]
+
+
+@benchmark("encode_legacy_str")
+def _encode_legacy_str(ctx):
+    characters = _plain_characters(ctx)
+
+    def run():
+        for character in characters:
+            str(character).encode("utf-8")
+    return run, len(characters)
+
+
+@benchmark("decode_legacy_eval")
+def _decode_legacy_eval(ctx):
+    texts = [str(c) for c in _plain_characters(ctx)]
+
+    def run():
+        for text in texts:
+            eval(text)
+    return run, len(texts)
+
+
+@benchmark("decode_legacy")
+def _decode_legacy(ctx):
+    blobs = [str(c).encode("utf-8") for c in _plain_characters(ctx)]
+
+    def run():
+        for data in blobs:
+            character_manager.decode_character(data)
+    return run, len(blobs)
+
+
+def _register_format(fmt):
+    @benchmark("encode_" + fmt)
+    def encode(ctx):
+        characters = ctx.characters()
+
+        def run():
+            for character in characters:
+                character_manager.encode_character(character, fmt)
+        return run, len(characters)
+
+    @benchmark("decode_" + fmt)
+    def decode(ctx):
+        blobs = [character_manager.encode_character(c, fmt)
+                 for c in ctx.characters()]
+
+        def run():
+            for data in blobs:
+                character_manager.decode_character(data)
+        return run, len(blobs)
+
+
+for _fmt in ("json", "binary"):
+    _register_format(_fmt)
+
+
+# ---------------- INVENTORY ----------------
+
+def _big_inventory_character():
+    character = character_manager.create_character("bench_inventory", "Warrior")
+    character["gold"] = 10 ** 12
+    return character
+
+
+def _with_inventory_size(size, action):
+    # Lift MAX_INVENTORY_SIZE for one run.
+    def run():
+        limit = inventory_system.MAX_INVENTORY_SIZE
+        inventory_system.MAX_INVENTORY_SIZE = size
+        try:
+            action()
+        finally:
+            inventory_system.MAX_INVENTORY_SIZE = limit
+    return run
+
+
+@benchmark("inventory_add_remove")
+def _inventory_add_remove(ctx):
+    count = ctx.scale["inventory"]
+    names = [datagen.item_id(n % 1000) for n in range(count)]
+
+    def action():
+        character = _big_inventory_character()
+        for name in names:
+            inventory_system.add_item_to_inventory(character, name)
+        for name in names:
+            inventory_system.remove_item_from_inventory(character, name)
+    return _with_inventory_size(count, action), 2 * count
+
+
+@benchmark("inventory_use_item")
+def _inventory_use_item(ctx):
+    count = ctx.scale["inventory"]
+    potion = {"type": "consumable", "effect": "health:1"}
+
+    def action():
+        character = _big_inventory_character()
+        character["inventory"] = ["potion"] * count
+        for _ in range(count):
+            inventory_system.use_item(character, "potion", potion)
+    return _with_inventory_size(count, action), count
+
+
+@benchmark("inventory_purchase_items")
+def _inventory_purchase_items(ctx):
+    count = ctx.scale["inventory"]
+    items = ctx.items()
+    basket = [(datagen.item_id(n % len(items)), 1) for n in range(count)]
+
+    def action():
+        inventory_system.purchase_items(_big_inventory_character(), basket, items)
+    return _with_inventory_size(count, action), count
+
+
+# ---------------- QUESTS ----------------
+
+def _quest_character():
+    character = character_manager.create_character("bench_quests", "Mage")
+    character["level"] = 15
+    character["completed_quests"] = [datagen.quest_id(n) for n in range(0, 200, 3)]
+    return character
+
+
+@benchmark("get_available_quests")
+def _get_available_quests(ctx):
+    quests = ctx.quests()
+    character = _quest_character()
+    return (lambda: quest_handler.get_available_quests(character, quests),
+            len(quests))
+
+
+@benchmark("quest_board_available")
+def _quest_board_available(ctx):
+    board = quest_handler.QuestBoard(
+        quest_handler.QuestIndex(ctx.quests()), _quest_character()
+    )
+    polls = 1000
+
+    def run():
+        for _ in range(polls):
+            board.available()
+    return run, polls
+
+
+# ---------------- COMBAT ----------------
+
+@benchmark("simple_battle_long")
+def _simple_battle_long(ctx):
+    health = ctx.scale["battle_health"]
+
+    def run():
+        character = character_manager.create_character("bench_fighter", "Warrior")
+        character["strength"] = 1
+        character["health"] = health * combat_system.ENEMY_DAMAGE + 1
+        enemy = combat_system.create_enemy("dragon")
+        enemy["health"] = health
+        combat_system.run_battle(combat_system.SimpleBattle(character, enemy))
+    return run, health
+
+
+@benchmark("resolve_battle_fast")
+def _resolve_battle_fast(ctx):
+    count = ctx.scale["characters"]
+    types = sorted(combat_system.get_enemy_types())
+
+    def run():
+        for n in range(count):
+            character = character_manager.create_character("bench", "Rogue")
+            enemy = combat_system.create_enemy(types[n % len(types)])
+            combat_system.resolve_battle_fast(character, enemy)
+    return run, count
+
+
+@benchmark("simulate_battles")
+def _simulate_battles(ctx):
+    characters = ctx.characters()
+    types = sorted(combat_system.get_enemy_types())
+    enemies = [combat_system.create_enemy(types[n % len(types)])
+               for n in range(len(characters))]
+    return lambda: combat_system.simulate_battles(characters, enemies), len(characters)
+
+
+# ---------------- RUNNER ----------------
+
+def _time(run, repeat):
+    # (seconds per call, seconds per reference call) for each of repeat
+    # samples. Benchmark and reference samples alternate so each pair
+    # sees the same machine conditions.
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    reference = timeit.Timer(_reference_work)
+    reference_number, _ = reference.autorange()
+    samples = []
+    for _ in range(repeat):
+        samples.append((
+            timer.timeit(number) / number,
+            reference.timeit(reference_number) / reference_number,
+        ))
+    return samples
+
+
+def _iqr(values):
+    if len(values) < 2:
+        return 0.0
+    quartiles = statistics.quantiles(values, n=4)
+    return quartiles[2] - quartiles[0]
+
+
+def _reference_work():
+    # Fixed pure-Python work (dicts, loops, strings) timed next to every
+    # benchmark, so a machine that is slower overall between two runs
+    # does not read as a regression.
+    counts = {}
+    for i in range(2000):
+        key = "k%d" % (i % 97)
+        counts[key] = counts.get(key, 0) + i
+    return sorted(counts.items())
+
+
+def run_benchmarks(scale_name, names, repeat, fsync_policy):
+    scale = SCALES[scale_name]
+    results = {}
+    old_save_dir = character_manager.SAVE_DIR
+    old_policy = character_manager.FSYNC_POLICY
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        character_manager.SAVE_DIR = os.path.join(workdir, "saves")
+        character_manager.set_fsync_policy(fsync_policy)
+        try:
+            ctx = Context(scale, workdir)
+            for name in names:
+                run, ops = BENCHMARKS[name](ctx)
+                samples = _time(run, repeat)
+                timings = [t for t, _ in samples]
+                ratios = [t / ref for t, ref in samples]
+                relative = statistics.median(ratios)
+                best = min(timings)
+                results[name] = {
+                    "min": best,
+                    "median": statistics.median(timings),
+                    # time in reference units, and its interquartile
+                    # range / median (one outlier sample does not count)
+                    "relative": relative,
+                    "spread": _iqr(ratios) / relative,
+                    "samples": ratios,
+                    "ops": ops,
+                    "ops_per_second": ops / best if best else None,
+                }
+                print("%-26s %10.6fs  %12.0f ops/s  spread %5.1f%%" % (
+                    name, best, results[name]["ops_per_second"] or 0,
+                    results[name]["spread"] * 100))
+        finally:
+            character_manager.SAVE_DIR = old_save_dir
+            character_manager.set_fsync_policy(old_policy)
+    return {
+        "meta": {
+            "scale": scale_name,
+            "repeat": repeat,
+            "fsync_policy": fsync_policy,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    # Print the change against baseline; returns the names that regressed.
+    if current["meta"]["scale"] != baseline["meta"]["scale"]:
+        print("warning: comparing scale %s against baseline scale %s" % (
+            current["meta"]["scale"], baseline["meta"]["scale"]))
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print("%-26s (new)" % name)
+            continue
+        ratio = result["relative"] / before["relative"]
+        noise = max(result.get("spread", 0.0), before.get("spread", 0.0))
+        allowed = max(tolerance, NOISE_FACTOR * noise)
+        status = "ok"
+        if ratio > 1 + allowed:
+            status = "REGRESSION"
+            regressions.append(name)
+        print("%-26s %+7.1f%%  (allowed +%.1f%%)  %s" % (
+            name, (ratio - 1) * 100, allowed * 100, status))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quest Chronicles benchmarks")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--only", help="comma separated benchmark names")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--fsync", default="never",
+                        choices=("always", "interval", "never"),
+                        help="fsync policy for the save benchmarks")
+    parser.add_argument("--output", help="where to write the JSON results")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="smallest allowed slowdown before failing, "
+                             "0.15 = 15%%; noisy benchmarks get more")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+
+    names = list(BENCHMARKS)
+    if args.only:
+        names = [name.strip() for name in args.only.split(",")]
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            parser.error("unknown benchmarks: " + ", ".join(unknown))
+
+    current = run_benchmarks(args.scale, names, args.repeat, args.fsync)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, "%s-%s.json" % (
+            args.scale, time.strftime("%Y%m%d-%H%M%S")))
+    with open(output, "w") as f:
+        json.dump(current, f, indent=2)
+    print("results written to", output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print("regressed:", ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,13 @@
+import ast
+import asyncio
+import json
 import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from custom_exceptions import (
     CharacterError,
     InvalidCharacterClassError,
@@ -6,6 +15,7 @@ from custom_exceptions import (
     CharacterDeadError,
     DataError,
 )
+from save_storage import DirectoryStore
 
 SAVE_DIR = os.path.join(os.path.dirname(__file__), "data", "save_games")
 
@@ -20,6 +30,210 @@ def add_gold(character, amount):
     character["gold"] = gold
 
 
+# Fields of every character, as built by create_character.
+CHARACTER_STR_FIELDS = ("name", "class")
+CHARACTER_INT_FIELDS = (
+    "level",
+    "experience",
+    "health",
+    "max_health",
+    "strength",
+    "magic",
+    "gold",
+)
+CHARACTER_LIST_FIELDS = ("inventory", "active_quests", "completed_quests")
+_SCHEMA_FIELDS = frozenset(
+    CHARACTER_STR_FIELDS + CHARACTER_INT_FIELDS + CHARACTER_LIST_FIELDS
+)
+
+
+class Character(MutableMapping):
+    # Compact character record. Fields from create_character live in
+    # __slots__ (read them as attributes on hot paths); any other keys,
+    # like equipped_weapon, go into a small extra dict made on first use.
+    # It also works as a mutable mapping, so character["health"] and
+    # character.get(...) keep working everywhere.
+    #
+    # Item assignment records the key as dirty for save_character_delta.
+    # Lists changed in place are reported through mark_dirty, and plain
+    # attribute writes are not tracked.
+
+    __slots__ = (
+        "name",
+        "class_name",
+        "level",
+        "experience",
+        "health",
+        "max_health",
+        "strength",
+        "magic",
+        "gold",
+        "inventory",
+        "active_quests",
+        "completed_quests",
+        "_extra",
+        "_dirty",
+        "has_snapshot",
+        "delta_count",
+    )
+
+    # mapping key -> slot, in create_character order
+    FIELDS = {
+        "name": "name",
+        "class": "class_name",
+        "level": "level",
+        "experience": "experience",
+        "health": "health",
+        "max_health": "max_health",
+        "strength": "strength",
+        "magic": "magic",
+        "gold": "gold",
+        "inventory": "inventory",
+        "active_quests": "active_quests",
+        "completed_quests": "completed_quests",
+    }
+    INT_FIELDS = frozenset(CHARACTER_INT_FIELDS)
+
+    def __init__(self, data=()):
+        self._extra = None
+        self._dirty = None
+        self.has_snapshot = False
+        self.delta_count = 0
+        for key, value in dict(data).items():
+            self._set(key, value)
+
+    def _set(self, key, value):
+        slot = self.FIELDS.get(key)
+        if slot is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        elif key in self.INT_FIELDS:
+            setattr(self, slot, int(value))
+        else:
+            setattr(self, slot, value)
+
+    # The three methods below are on every caller's hot path, so they
+    # inline the slot lookup and dirty marking instead of going through
+    # _set/mark_dirty.
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.FIELDS[key])
+        except KeyError:
+            if self._extra is None:
+                raise
+            return self._extra[key]
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return getattr(self, self.FIELDS[key], default)
+        except KeyError:
+            if self._extra is None:
+                return default
+            return self._extra.get(key, default)
+
+    def __setitem__(self, key, value):
+        slot = self.FIELDS.get(key)
+        if slot is None:
+            self._set(key, value)
+        elif type(value) is int or key not in self.INT_FIELDS:
+            setattr(self, slot, value)
+        else:
+            setattr(self, slot, int(value))
+        dirty = self._dirty
+        if dirty is None:
+            self._dirty = {key}
+        else:
+            dirty.add(key)
+
+    def __delitem__(self, key):
+        slot = self.FIELDS.get(key)
+        if slot is None:
+            if self._extra is None:
+                raise KeyError(key)
+            del self._extra[key]
+        else:
+            try:
+                delattr(self, slot)
+            except AttributeError:
+                raise KeyError(key)
+        self.mark_dirty(key)
+
+    def __contains__(self, key):
+        slot = self.FIELDS.get(key)
+        if slot is None:
+            return self._extra is not None and key in self._extra
+        return hasattr(self, slot)
+
+    def __iter__(self):
+        for key, slot in self.FIELDS.items():
+            if hasattr(self, slot):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        count = sum(1 for slot in self.FIELDS.values() if hasattr(self, slot))
+        return count + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def copy(self):
+        # Shallow copy like dict.copy(): field values (lists included) are
+        # shared, but the extra keys and dirty set are the copy's own.
+        clone = Character.__new__(Character)
+        for slot in self.__slots__:
+            if hasattr(self, slot):
+                setattr(clone, slot, getattr(self, slot))
+        if self._extra is not None:
+            clone._extra = dict(self._extra)
+        if self._dirty is not None:
+            clone._dirty = set(self._dirty)
+        return clone
+
+    __copy__ = copy
+
+    @property
+    def dirty(self):
+        # Keys changed since the last save (a copy).
+        return set(self._dirty) if self._dirty else set()
+
+    def mark_dirty(self, key):
+        if self._dirty is None:
+            self._dirty = {key}
+        else:
+            self._dirty.add(key)
+
+    def mark_saved(self, delta_count=0):
+        self._dirty = None
+        self.has_snapshot = True
+        self.delta_count = delta_count
+
+
+def mark_dirty(character, field):
+    # Record an in-place change to field; no-op for plain dicts.
+    if isinstance(character, Character):
+        character.mark_dirty(field)
+
+
+def set_untracked(character, key, value):
+    # Set key without marking it dirty, e.g. when swapping a list for an
+    # equivalent container that saves the same way.
+    if isinstance(character, Character):
+        character._set(key, value)
+    else:
+        character[key] = value
+
+
+def _mark_saved(character):
+    if isinstance(character, Character):
+        character.mark_saved()
+
+
 # Base stats for required classes
 CLASS_STATS = {
     "Warrior": {"max_health": 120, "strength": 15, "magic": 3},
@@ -30,13 +244,13 @@ CLASS_STATS = {
 
 
 def create_character(name, class_name):
-    # Create and return a new character dictionary.
+    # Create and return a new Character.
     if class_name not in CLASS_STATS:
         raise InvalidCharacterClassError("Invalid class: " + class_name)
 
     stats = CLASS_STATS[class_name]
 
-    return {
+    return Character({
         "name": name,
         "class": class_name,
         "level": 1,
@@ -49,75 +263,580 @@ def create_character(name, class_name):
         "inventory": [],
         "active_quests": [],
         "completed_quests": [],
-    }
+    })
 
 
-def _get_save_path(name):
-    if not os.path.isdir(SAVE_DIR):
-        os.makedirs(SAVE_DIR, exist_ok=True)
-    return os.path.join(SAVE_DIR, name + ".txt")
+# Saves go through a storage backend (see save_storage). By default it is
+# a DirectoryStore on SAVE_DIR; set_storage swaps in another backend.
+_storage = None
+_dir_store = None
 
 
-def save_character(character):
-    # Save character to a file. Return True on success.
+def set_storage(storage):
+    # Use storage for saves, or None to go back to SAVE_DIR files.
+    global _storage
+    _storage = storage
+
+
+def get_storage():
+    global _dir_store
+    if _storage is not None:
+        return _storage
+    if _dir_store is None or _dir_store.root != SAVE_DIR:
+        _dir_store = DirectoryStore(SAVE_DIR)
+    return _dir_store
+
+
+# Versioned save format. Every save holds the fields of create_character,
+# and any other keys (equipment etc.) go into "extra".
+SAVE_FORMAT_VERSION = 1
+SAVE_FORMAT = "json"  # or "binary"
+
+# Binary layout: magic, version + int fields, then length-prefixed
+# strings, NUL-joined lists and a JSON blob for extra keys.
+_BINARY_MAGIC = b"QCSB"
+_BINARY_HEADER = struct.Struct("<H" + "q" * len(CHARACTER_INT_FIELDS))
+_LENGTH = struct.Struct("<I")
+_COUNTED_LENGTH = struct.Struct("<II")
+
+
+def _extra_fields(character):
+    return {k: v for k, v in character.items() if k not in _SCHEMA_FIELDS}
+
+
+def _encode_json(character):
+    payload = {"version": SAVE_FORMAT_VERSION}
+    for key in CHARACTER_STR_FIELDS:
+        payload[key] = str(character.get(key, ""))
+    for key in CHARACTER_INT_FIELDS:
+        payload[key] = int(character.get(key, 0))
+    for key in CHARACTER_LIST_FIELDS:
+        payload[key] = list(character.get(key, ()))
+    payload["extra"] = _extra_fields(character)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def _encode_binary(character):
+    parts = [
+        _BINARY_MAGIC,
+        _BINARY_HEADER.pack(
+            SAVE_FORMAT_VERSION,
+            *[int(character.get(key, 0)) for key in CHARACTER_INT_FIELDS]
+        ),
+    ]
+    for key in CHARACTER_STR_FIELDS:
+        raw = str(character.get(key, "")).encode("utf-8")
+        parts.append(_LENGTH.pack(len(raw)))
+        parts.append(raw)
+    for key in CHARACTER_LIST_FIELDS:
+        values = [str(v) for v in character.get(key, ())]
+        raw = "\0".join(values).encode("utf-8")
+        if len(values) != raw.count(b"\0") + (1 if values else 0):
+            raise ValueError("List entries cannot contain NUL: " + key)
+        parts.append(_COUNTED_LENGTH.pack(len(values), len(raw)))
+        parts.append(raw)
+    extra = _extra_fields(character)
+    raw = json.dumps(extra, separators=(",", ":")).encode("utf-8") if extra else b""
+    parts.append(_LENGTH.pack(len(raw)))
+    parts.append(raw)
+    return b"".join(parts)
+
+
+def _decode_json(data):
+    payload = json.loads(data)
+    if payload.get("version") != SAVE_FORMAT_VERSION:
+        raise ValueError("Unsupported save version")
+    character = {}
+    for key in CHARACTER_STR_FIELDS:
+        character[key] = str(payload[key])
+    for key in CHARACTER_INT_FIELDS:
+        character[key] = int(payload[key])
+    for key in CHARACTER_LIST_FIELDS:
+        character[key] = [str(v) for v in payload[key]]
+    character.update(payload.get("extra", {}))
+    return character
+
+
+def _decode_binary(data):
+    offset = len(_BINARY_MAGIC)
+    header = _BINARY_HEADER.unpack_from(data, offset)
+    offset += _BINARY_HEADER.size
+    if header[0] != SAVE_FORMAT_VERSION:
+        raise ValueError("Unsupported save version")
+
+    character = {}
+    strings = []
+    for key in CHARACTER_STR_FIELDS:
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        strings.append((key, data[offset:offset + length].decode("utf-8")))
+        offset += length
+    # Keep the create_character key order: name, class, ints, lists.
+    character.update(strings)
+    character.update(zip(CHARACTER_INT_FIELDS, header[1:]))
+    for key in CHARACTER_LIST_FIELDS:
+        count, length = _COUNTED_LENGTH.unpack_from(data, offset)
+        offset += _COUNTED_LENGTH.size
+        raw = data[offset:offset + length]
+        offset += length
+        values = raw.decode("utf-8").split("\0") if count else []
+        if len(values) != count:
+            raise ValueError("Corrupt list field: " + key)
+        character[key] = values
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    if length:
+        character.update(json.loads(data[offset:offset + length]))
+    return character
+
+
+def encode_character(character, fmt=None):
+    # Serialize a character dict to bytes in the given save format.
+    fmt = fmt or SAVE_FORMAT
+    if fmt == "json":
+        return _encode_json(character)
+    if fmt == "binary":
+        return _encode_binary(character)
+    raise CharacterError("Unknown save format: " + str(fmt))
+
+
+def decode_character(data):
+    # Parse bytes written by encode_character (or an old str(dict) save).
+    # Raises ValueError if the data is not a valid save.
+    if data.startswith(_BINARY_MAGIC):
+        try:
+            return _decode_binary(data)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ValueError(str(e))
+    text = data.decode("utf-8").strip()
+    if text.startswith("{\""):
+        try:
+            return _decode_json(text)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError("Missing or bad field: " + str(e))
+    # Saves from before the versioned format were written with str(dict).
+    character = ast.literal_eval(text)
+    if not isinstance(character, dict):
+        raise ValueError("Save is not a character dict")
+    return character
+
+
+# When save writes are fsynced: "always" (every write), "interval" (writes
+# are not fsynced one by one; everything written is synced at most
+# FSYNC_INTERVAL_MS later) or "never". Writes are always temp file + rename.
+FSYNC_POLICY = "always"
+FSYNC_INTERVAL_MS = 1000
+_FSYNC_POLICIES = ("always", "interval", "never")
+_last_fsync = 0.0
+_sync_timer = None
+_sync_lock = threading.Lock()
+
+
+def set_fsync_policy(policy, interval_ms=None):
+    global FSYNC_POLICY, FSYNC_INTERVAL_MS
+    if policy not in _FSYNC_POLICIES:
+        raise CharacterError("Unknown fsync policy: " + str(policy))
+    FSYNC_POLICY = policy
+    if interval_ms is not None:
+        FSYNC_INTERVAL_MS = interval_ms
+
+
+def _should_fsync(storage):
+    # Whether a write to storage is fsynced as part of the write itself.
+    # Stores that queue unsynced writes only do so under "interval",
+    # where _after_write drains the queue.
+    if hasattr(storage, "track_unsynced"):
+        storage.track_unsynced = FSYNC_POLICY == "interval"
+    return FSYNC_POLICY == "always"
+
+
+def _after_write(storage):
+    # Under "interval", sync storage now if the interval has passed,
+    # otherwise make sure a timer will do it when it does.
+    global _last_fsync, _sync_timer
+    if FSYNC_POLICY != "interval":
+        return
+    with _sync_lock:
+        wait = _last_fsync + FSYNC_INTERVAL_MS / 1000.0 - time.monotonic()
+        if wait > 0:
+            if _sync_timer is None:
+                _sync_timer = threading.Timer(wait, _timed_sync, (storage,))
+                _sync_timer.daemon = True
+                _sync_timer.start()
+            return
+        _last_fsync = time.monotonic()
+    storage.sync()
+
+
+def _timed_sync(storage):
+    global _last_fsync, _sync_timer
+    with _sync_lock:
+        _sync_timer = None
+        _last_fsync = time.monotonic()
+    try:
+        storage.sync()
+    except OSError:
+        pass  # paths stay queued; the next sync retries them
+
+
+def _encode_for_save(character, fmt):
     name = character.get("name")
     if not name:
         raise CharacterError("Character must have a name to save.")
+    try:
+        return name, encode_character(character, fmt)
+    except (TypeError, ValueError, struct.error):
+        raise DataError("Character data cannot be saved: " + name)
+
+
+def save_character(character, fmt=None):
+    # Save character to a file. Return True on success.
+    name, data = _encode_for_save(character, fmt)
+    try:
+        storage = get_storage()
+        storage.save_many([(name, data)], _should_fsync(storage))
+        _after_write(storage)
+    except OSError:
+        raise DataError("Failed to save character: " + name)
+    _mark_saved(character)
+    return True
+
+
+def save_characters(batch, fmt=None):
+    # Save many characters in one flush cycle. Later entries for the same
+    # name win. Nothing is written if any character fails to encode.
+    # Returns the number of files written.
+    batch = list(batch)
+    encoded = {}
+    for character in batch:
+        name, data = _encode_for_save(character, fmt)
+        encoded[name] = data
+    if not encoded:
+        return 0
+    _store_encoded(encoded)
+    for character in batch:
+        _mark_saved(character)
+    return len(encoded)
 
-    path = _get_save_path(name)
+
+def _store_encoded(encoded):
+    # Write {name: save bytes} in one storage flush.
     try:
-        with open(path, "w") as f:
-            f.write(str(character) + "\n")
+        storage = get_storage()
+        storage.save_many(list(encoded.items()), _should_fsync(storage))
+        _after_write(storage)
+    except OSError:
+        raise DataError("Failed to save characters: " + ", ".join(encoded))
+
+
+# ---------------- DELTA SAVES ----------------
+
+# A tracked character gets a full snapshot after this many deltas.
+CHECKPOINT_EVERY = 50
+
+
+def _normalize_field(key, value):
+    if key in CHARACTER_LIST_FIELDS:
+        return list(value)
+    if key in CHARACTER_INT_FIELDS:
+        return int(value)
+    return value
+
+
+def _encode_delta(character):
+    changed = {}
+    removed = []
+    for key in character._dirty:
+        if key in character:
+            changed[key] = _normalize_field(key, character[key])
+        else:
+            removed.append(key)
+    payload = {"set": changed, "unset": removed}
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def _apply_delta(character, data):
+    delta = json.loads(data)
+    character.update(delta["set"])
+    for key in delta["unset"]:
+        character.pop(key, None)
+
+
+def save_character_delta(character, fmt=None):
+    # Persist only the fields changed since the last save. Falls back to a
+    # full save for untracked characters, before the first snapshot and
+    # every CHECKPOINT_EVERY deltas.
+    if (
+        not isinstance(character, Character)
+        or not character.has_snapshot
+        or character.delta_count >= CHECKPOINT_EVERY
+    ):
+        return save_character(character, fmt)
+    if not character._dirty:
         return True
+
+    name = character.get("name")
+    if not name:
+        raise CharacterError("Character must have a name to save.")
+    try:
+        data = _encode_delta(character)
+    except (TypeError, ValueError):
+        raise DataError("Character data cannot be saved: " + name)
+
+    try:
+        storage = get_storage()
+        storage.append_delta(name, data, _should_fsync(storage))
+        _after_write(storage)
+    except KeyError:
+        # No snapshot in storage (deleted or new backend).
+        return save_character(character, fmt)
     except OSError:
         raise DataError("Failed to save character: " + name)
 
+    character.mark_saved(character.delta_count + 1)
+    return True
+
 
 def load_character(name):
     # Load character by name raise CharacterNotFoundError if missing.
-    path = _get_save_path(name)
-    if not os.path.exists(path):
-        raise CharacterNotFoundError("No saved character named '" + name + "'")
-
     try:
-        with open(path, "r") as f:
-            text = f.read().strip()
-        character = eval(text)
-        return character
+        data, deltas = get_storage().load_with_deltas(name)
+    except KeyError:
+        raise CharacterNotFoundError("No saved character named '" + name + "'")
     except OSError:
         raise DataError("Failed to read character file for '" + name + "'")
 
+    try:
+        character = Character(decode_character(data))
+        for delta in deltas:
+            _apply_delta(character, delta)
+    except (ValueError, SyntaxError, KeyError, TypeError):
+        raise DataError("Corrupt save file for '" + name + "'")
+
+    character.mark_saved(len(deltas))
+    return character
+
 
 def delete_character(name):
-    # Delete a saved character file.
-    path = _get_save_path(name)
-    if not os.path.exists(path):
+    # Delete a saved character.
+    try:
+        get_storage().delete(name)
+    except KeyError:
         raise CharacterNotFoundError("No saved character named '" + name + "'")
-    os.remove(path)
+    except OSError:
+        raise DataError("Failed to delete character '" + name + "'")
+    return True
+
+
+def list_characters():
+    # Names of all saved characters.
+    try:
+        return get_storage().names()
+    except OSError:
+        raise DataError("Failed to list saved characters")
+
+
+# ---------------- ASYNC SAVES ----------------
+
+# Blocking save/load work runs on this bounded pool so the game loop's
+# event loop never waits on disk.
+SAVE_IO_WORKERS = 4
+_io_executor = None
+
+
+def _get_io_executor():
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(
+            max_workers=SAVE_IO_WORKERS, thread_name_prefix="save-io"
+        )
+    return _io_executor
+
+
+async def async_save_character(character, fmt=None):
+    # Encode now (a snapshot of the current state), write on the pool.
+    name, data = _encode_for_save(character, fmt)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_get_io_executor(), _store_encoded, {name: data})
     return True
 
 
+async def async_load_character(name):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_executor(), load_character, name)
+
+
+class WriteBehindQueue:
+    # Write-behind autosave queue. enqueue() snapshots a character and
+    # returns right away; a background task flushes everything pending
+    # every flush_interval seconds (or sooner once max_depth is reached).
+    # Several enqueues of one character before a flush become one write.
+
+    def __init__(self, flush_interval=0.5, max_depth=10000, fmt=None):
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self.fmt = fmt
+        self._pending = {}
+        self._oldest = None
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+        # Observable state, see stats().
+        self.flushes = 0
+        self.saved = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def enqueue(self, character):
+        name, data = _encode_for_save(character, self.fmt)
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending[name] = data
+        if len(self._pending) >= self.max_depth:
+            self._wake.set()
+
+    async def flush(self):
+        # Write everything pending now. Returns the number saved.
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch = self._pending
+            self._pending = {}
+            self._oldest = None
+
+            loop = asyncio.get_running_loop()
+            started = time.monotonic()
+            try:
+                await loop.run_in_executor(
+                    _get_io_executor(), _store_encoded, batch
+                )
+            except DataError as e:
+                # Keep the failed saves unless a newer snapshot arrived.
+                for name, data in batch.items():
+                    self._pending.setdefault(name, data)
+                if self._oldest is None:
+                    self._oldest = started
+                self.errors += 1
+                self.last_error = str(e)
+                return 0
+            finally:
+                latency = time.monotonic() - started
+                self.last_flush_latency = latency
+                self.max_flush_latency = max(self.max_flush_latency, latency)
+
+            self.flushes += 1
+            self.saved += len(batch)
+            return len(batch)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        # Start the background flusher on the running event loop.
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        # Stop the flusher and write whatever is still pending.
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        oldest = self._oldest
+        return {
+            "depth": len(self._pending),
+            "oldest_pending_seconds": (
+                time.monotonic() - oldest if oldest is not None else 0.0
+            ),
+            "flushes": self.flushes,
+            "saved": self.saved,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+        }
+
+
+# ---------------- EXPERIENCE ----------------
+
+# Going from level L to L + 1 costs XP_PER_LEVEL * L experience.
+# LEVEL_XP[L - 1] is the total experience needed to reach level L from
+# level 1, so LEVEL_XP[0] == 0. "experience" on a character is progress
+# within its current level, as before.
+XP_PER_LEVEL = 100
+MAX_LEVEL = 100
+HEALTH_PER_LEVEL = 10
+
+
+def _build_level_table(max_level):
+    table = [0]
+    for level in range(1, max_level):
+        table.append(table[-1] + XP_PER_LEVEL * level)
+    return table
+
+
+LEVEL_XP = _build_level_table(MAX_LEVEL)
+
+
+def level_for_experience(level, experience):
+    # Resolve (level, experience in level) after any number of level-ups.
+    # At MAX_LEVEL experience keeps accumulating. Levels below 1 (corrupt
+    # saves) count as level 1.
+    if level >= MAX_LEVEL or experience <= 0:
+        return level, experience
+    level = max(level, 1)
+    total = LEVEL_XP[level - 1] + experience
+    new_level = bisect_right(LEVEL_XP, total)
+    return new_level, total - LEVEL_XP[new_level - 1]
+
+
 def gain_experience(character, amount):
-    # Add XP, level up if needed, restore full health on level up.
+    # Add XP, level up as many times as it pays for, restore full health
+    # on level up. Quest and combat rewards all come through here.
     if character.get("health", 0) <= 0:
         raise CharacterDeadError("Dead characters cannot gain XP.")
 
     if amount < 0:
         raise CharacterError("XP amount cannot be negative.")
 
+    level = character.get("level", 1)
+    new_level, experience = level_for_experience(
+        level, character.get("experience", 0) + amount
+    )
+    set_level_progress(character, level, new_level, experience)
+    return True
 
-    xp_before = character.get("experience", 0)
-    xp_after = xp_before + amount
 
-    if xp_after >= 100:
-        # Level up once
-        xp_after -= 100
-        character["level"] += 1
-        character["max_health"] += 10
+def set_level_progress(character, level, new_level, experience):
+    # Store a result of level_for_experience for a character that was at
+    # level. Each level gained adds HEALTH_PER_LEVEL max health and
+    # restores full health.
+    if new_level > level:
+        character["level"] = new_level
+        character["max_health"] = (
+            character.get("max_health", 0) + HEALTH_PER_LEVEL * (new_level - level)
+        )
         character["health"] = character["max_health"]
-
-    character["experience"] = xp_after
-    return True
+    character["experience"] = experience
 
 def heal_character(character, amount):
     # Heal character up to max_health.
@@ -129,3 +848,123 @@ def heal_character(character, amount):
     character["health"] = min(health, max_h)
     return True
 
+
+# ---------------- REGENERATION ----------------
+
+def heal_characters(characters, amount):
+    # heal_character for many characters in one pass. Dead characters
+    # (health <= 0) and characters already at max_health are skipped
+    # without raising. Returns the number of characters healed.
+    if amount < 0:
+        raise CharacterError("Heal amount cannot be negative.")
+
+    healed = 0
+    for character in characters:
+        if type(character) is Character:
+            # Slot attributes directly, skipping the mapping methods.
+            health = getattr(character, "health", 0)
+            max_health = getattr(character, "max_health", 0)
+            if 0 < health < max_health:
+                health += amount
+                character.health = health if health < max_health else max_health
+                character.mark_dirty("health")
+                healed += 1
+            continue
+        health = character.get("health", 0)
+        if health <= 0:
+            continue
+        max_health = character.get("max_health", 0)
+        if health < max_health:
+            health += amount
+            character["health"] = health if health < max_health else max_health
+            healed += 1
+    return healed
+
+
+class RegenScheduler:
+    # Heals every live character by amount every interval seconds.
+    # Populations are lists of characters or CharacterTables (anything
+    # with heal_all(amount) is healed through that, in one column pass).
+    # Per-tick cost is reported by stats().
+
+    def __init__(self, amount, interval=5.0):
+        if amount < 0:
+            raise CharacterError("Heal amount cannot be negative.")
+        self.amount = amount
+        self.interval = interval
+        self._populations = []
+        self._task = None
+
+        # Observable state, see stats().
+        self.ticks = 0
+        self.healed = 0
+        self.last_healed = 0
+        self.last_size = 0
+        self.last_tick_seconds = 0.0
+        self.max_tick_seconds = 0.0
+        self.total_tick_seconds = 0.0
+
+    def add(self, population):
+        self._populations.append(population)
+        return population
+
+    def remove(self, population):
+        self._populations.remove(population)
+
+    def tick(self):
+        # Run one regeneration pass now; returns the number healed.
+        started = time.perf_counter()
+        healed = 0
+        size = 0
+        for population in self._populations:
+            size += len(population)
+            heal_all = getattr(population, "heal_all", None)
+            if heal_all is not None:
+                healed += heal_all(self.amount)
+            else:
+                healed += heal_characters(population, self.amount)
+        elapsed = time.perf_counter() - started
+
+        self.ticks += 1
+        self.healed += healed
+        self.last_healed = healed
+        self.last_size = size
+        self.last_tick_seconds = elapsed
+        self.max_tick_seconds = max(self.max_tick_seconds, elapsed)
+        self.total_tick_seconds += elapsed
+        return healed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.tick()
+
+    def start(self):
+        # Start ticking on the running event loop.
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "ticks": self.ticks,
+            "healed": self.healed,
+            "last_healed": self.last_healed,
+            "last_size": self.last_size,
+            "last_tick_seconds": self.last_tick_seconds,
+            "max_tick_seconds": self.max_tick_seconds,
+            "avg_tick_seconds": (
+                self.total_tick_seconds / self.ticks if self.ticks else 0.0
+            ),
+            "per_character_seconds": (
+                self.last_tick_seconds / self.last_size if self.last_size else 0.0
+            ),
+        }
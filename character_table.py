@@ -0,0 +1,169 @@
+import heapq
+from array import array
+from collections.abc import MutableMapping
+from character_manager import (
+    CHARACTER_INT_FIELDS,
+    CHARACTER_LIST_FIELDS,
+    Character,
+    load_character,
+    save_characters,
+)
+from custom_exceptions import CharacterError
+
+
+def _copy_fields(fields):
+    # Shallow copy with the list fields (inventory, quests) copied too.
+    return {
+        k: list(v) if k in CHARACTER_LIST_FIELDS else v
+        for k, v in fields
+    }
+
+
+class CharacterTable:
+    # Many characters stored column by column: one array("q") per int
+    # field (level, experience, health, ...). Everything else (name,
+    # class, inventory, quests, equipped items) stays in one small dict
+    # per row. Whole-population work like leaderboards, gold audits and
+    # healing ticks runs over the arrays instead of over dicts.
+    #
+    # table[i] is a CharacterRow: a live view of row i that works
+    # anywhere a character dict does, with int fields read from and
+    # written to the columns directly.
+
+    def __init__(self):
+        self.columns = {field: array("q") for field in CHARACTER_INT_FIELDS}
+        self._rest = []
+
+    @classmethod
+    def from_characters(cls, characters):
+        table = cls()
+        table.extend(characters)
+        return table
+
+    @classmethod
+    def from_saves(cls, names):
+        # Load saved characters by name (CharacterNotFoundError etc. as
+        # load_character).
+        return cls.from_characters(load_character(name) for name in names)
+
+    def append(self, character):
+        # Copy a character in as a new row; returns its row index. Every
+        # int field is checked before any column grows, so a bad row
+        # leaves the table as it was.
+        values = [character.get(field, 0) for field in self.columns]
+        for field, value in zip(self.columns, values):
+            if type(value) is not int:
+                raise CharacterError("Field must be an integer: " + field)
+        for column, value in zip(self.columns.values(), values):
+            column.append(value)
+        self._rest.append(_copy_fields(
+            (k, v) for k, v in character.items() if k not in self.columns
+        ))
+        return len(self._rest) - 1
+
+    def extend(self, characters):
+        for character in characters:
+            self.append(character)
+
+    def column(self, field):
+        # The array behind an int field (shared, not a copy).
+        return self.columns[field]
+
+    def __len__(self):
+        return len(self._rest)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self._rest)
+        if not 0 <= index < len(self._rest):
+            raise IndexError("row out of range")
+        return CharacterRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self._rest)):
+            yield CharacterRow(self, index)
+
+    # ---------------- EXPORT ----------------
+
+    def to_character(self, index):
+        # Independent Character copy of one row.
+        return Character(_copy_fields(self[index].items()))
+
+    def to_characters(self):
+        return [self.to_character(i) for i in range(len(self._rest))]
+
+    def save_all(self, fmt=None):
+        # Save every row in one flush; returns the number saved.
+        return save_characters(list(self), fmt)
+
+    # ---------------- BATCH QUERIES ----------------
+
+    def total(self, field):
+        return sum(self.columns[field])
+
+    def top(self, field, n):
+        # Row indexes of the n highest values of field, highest first.
+        column = self.columns[field]
+        return heapq.nlargest(n, range(len(column)), key=column.__getitem__)
+
+    def heal_all(self, amount):
+        # heal_characters over the health columns: live characters below
+        # max_health gain amount, clamped. Returns the number healed.
+        if amount < 0:
+            raise CharacterError("Heal amount cannot be negative.")
+        health = self.columns["health"]
+        max_health = self.columns["max_health"]
+        healed = 0
+        for i, current in enumerate(health):
+            if current <= 0:
+                continue
+            cap = max_health[i]
+            if current < cap:
+                current += amount
+                health[i] = current if current < cap else cap
+                healed += 1
+        return healed
+
+    def rows_where(self, field, minimum):
+        # Row indexes with field >= minimum.
+        column = self.columns[field]
+        return [i for i, value in enumerate(column) if value >= minimum]
+
+
+class CharacterRow(MutableMapping):
+    # One row of a CharacterTable as a character mapping. Nothing is
+    # copied: reads and writes of int fields go straight to the columns.
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        column = self._table.columns.get(key)
+        if column is not None:
+            return column[self._index]
+        return self._table._rest[self._index][key]
+
+    def __setitem__(self, key, value):
+        column = self._table.columns.get(key)
+        if column is not None:
+            column[self._index] = value
+        else:
+            self._table._rest[self._index][key] = value
+
+    def __delitem__(self, key):
+        if key in self._table.columns:
+            raise CharacterError("Cannot remove field: " + key)
+        del self._table._rest[self._index][key]
+
+    def __iter__(self):
+        yield from self._table.columns
+        yield from self._table._rest[self._index]
+
+    def __len__(self):
+        return len(self._table.columns) + len(self._table._rest[self._index])
+
+    def __repr__(self):
+        return "CharacterRow(" + repr(dict(self)) + ")"
@@ -1,24 +1,171 @@
-from custom_exceptions import InvalidTargetError, CombatNotActiveError
+import os
+from array import array
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from custom_exceptions import CombatError, InvalidTargetError, CombatNotActiveError
+from character_manager import add_gold, gain_experience
+from game_data import load_enemies
 
-ENEMY_TYPES = {
-    "goblin": {"name": "Goblin", "health": 30, "xp_reward": 20, "gold_reward": 10},
-    "orc": {"name": "Orc", "health": 60, "xp_reward": 40, "gold_reward": 20},
-    "dragon": {"name": "Dragon", "health": 150, "xp_reward": 100, "gold_reward": 50},
-}
+# Enemy types come from data/enemies.txt, loaded on first use.
+ENEMY_DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "enemies.txt")
+_enemy_types = None
+
+# SimpleBattle damage model
+PLAYER_DEFAULT_DAMAGE = 10
+ENEMY_DAMAGE = 5
+
+
+class EnemyTemplate:
+    # Immutable data shared by every enemy of one type (flyweight).
+
+    __slots__ = ("enemy_type", "name", "health", "xp_reward", "gold_reward")
+
+    def __init__(self, enemy_type, base):
+        self.enemy_type = enemy_type
+        self.name = base["name"]
+        self.health = base["health"]
+        self.xp_reward = base["xp_reward"]
+        self.gold_reward = base["gold_reward"]
+
+
+class Enemy(MutableMapping):
+    # One spawned enemy. Only its health is stored per instance, and the
+    # rest is read from the shared template. Behaves like the old enemy
+    # dict ({"name", "health", "xp_reward", "gold_reward"}). Writing any
+    # key other than health stores a per-instance override, so the
+    # template is never changed.
+
+    __slots__ = ("template", "health", "_overrides", "released")
+
+    KEYS = ("name", "health", "xp_reward", "gold_reward")
+
+    def __init__(self, template):
+        self.template = template
+        self.health = template.health
+        self._overrides = None
+        # True while handed back to an EnemyPool.
+        self.released = False
+
+    def reset(self):
+        self.health = self.template.health
+        self._overrides = None
+
+    def __getitem__(self, key):
+        if key == "health":
+            return self.health
+        if self._overrides is not None and key in self._overrides:
+            return self._overrides[key]
+        if key in self.KEYS:
+            return getattr(self.template, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        if key == "health":
+            self.health = value
+        else:
+            if self._overrides is None:
+                self._overrides = {}
+            self._overrides[key] = value
+
+    def __delitem__(self, key):
+        if self._overrides is None or key not in self._overrides:
+            raise KeyError(key)
+        del self._overrides[key]
+
+    def __iter__(self):
+        yield from self.KEYS
+        if self._overrides:
+            for key in self._overrides:
+                if key not in self.KEYS:
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+_templates = {}
+
+
+def get_enemy_types():
+    # {enemy_id: enemy record} from ENEMY_DATA_PATH.
+    global _enemy_types
+    if _enemy_types is None:
+        _enemy_types = load_enemies(ENEMY_DATA_PATH)
+    return _enemy_types
+
+
+def __getattr__(name):
+    # ENEMY_TYPES was a module-level dict; it now reads the loaded catalog.
+    if name == "ENEMY_TYPES":
+        return get_enemy_types()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def set_enemy_types(enemy_types):
+    # Swap in a new enemy catalog (None reloads from disk on next use).
+    # Enemies already spawned keep their old template.
+    global _enemy_types, _templates
+    _enemy_types = enemy_types
+    _templates = {}
+
+
+def get_enemy_template(enemy_type):
+    template = _templates.get(enemy_type)
+    if template is None:
+        enemy_types = get_enemy_types()
+        if enemy_type not in enemy_types:
+            raise InvalidTargetError("Unknown enemy type: " + enemy_type)
+        template = EnemyTemplate(enemy_type, enemy_types[enemy_type])
+        _templates[enemy_type] = template
+    return template
 
 
 def create_enemy(enemy_type):
-    if enemy_type not in ENEMY_TYPES:
-        raise InvalidTargetError("Unknown enemy type: " + enemy_type)
+    # Fresh enemy sharing its type's template.
+    return Enemy(get_enemy_template(enemy_type))
 
-    base = ENEMY_TYPES[enemy_type]
-    # return a fresh copy
-    return {
-        "name": base["name"],
-        "health": base["health"],
-        "xp_reward": base["xp_reward"],
-        "gold_reward": base["gold_reward"],
-    }
+
+class EnemyPool:
+    # Recycles enemies so spawners do not allocate a new one per fight.
+    # Defeated enemies are handed back with release() (SimpleBattle does
+    # this when given a pool). They are only reset when acquired again, so
+    # their rewards can still be read right after the battle. Releasing
+    # an enemy that is already back in the pool is ignored, so it is
+    # never handed out twice.
+
+    def __init__(self, max_free=1024):
+        self.max_free = max_free
+        self._free = {}
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, enemy_type):
+        free = self._free.get(enemy_type)
+        if free:
+            enemy = free.pop()
+            enemy.reset()
+            enemy.released = False
+            self.reused += 1
+            return enemy
+        self.created += 1
+        return create_enemy(enemy_type)
+
+    def release(self, enemy):
+        if not isinstance(enemy, Enemy) or enemy.released:
+            return
+        enemy.released = True
+        free = self._free.setdefault(enemy.template.enemy_type, [])
+        if len(free) < self.max_free:
+            free.append(enemy)
 
 
 def get_victory_rewards(enemy):
@@ -32,9 +179,10 @@ def get_victory_rewards(enemy):
 class SimpleBattle:
 
 
-    def __init__(self, character, enemy):
+    def __init__(self, character, enemy, pool=None):
         self.character = character
         self.enemy = enemy
+        self.pool = pool
         self.combat_active = True
 
     def start_battle(self):
@@ -46,17 +194,279 @@ class SimpleBattle:
             raise CombatNotActiveError("Combat is not active.")
 
         # Simple damage model player uses strength if present else 10
-        damage = self.character.get("strength", 10)
-        self.enemy["health"] = max(0, self.enemy.get("health", 0) - damage)
-        if self.enemy["health"] <= 0:
+        damage = self.character.get("strength", PLAYER_DEFAULT_DAMAGE)
+        health = max(0, self.enemy.get("health", 0) - damage)
+        self.enemy["health"] = health
+        if health <= 0:
             self.combat_active = False
+            if self.pool is not None:
+                self.pool.release(self.enemy)
 
     def enemy_turn(self):
         if not self.combat_active:
             raise CombatNotActiveError("Combat is not active.")
 
         # Simple damage model enemy deals 5 damage
-        dmg = 5
-        self.character["health"] = max(0, self.character.get("health", 0) - dmg)
-        if self.character["health"] <= 0:
+        dmg = ENEMY_DAMAGE
+        health = max(0, self.character.get("health", 0) - dmg)
+        self.character["health"] = health
+        if health <= 0:
             self.combat_active = False
+
+
+
+def run_battle(battle):
+    # Play a battle turn by turn until it ends; returns the turns taken.
+    battle.start_battle()
+    turns = 0
+    while battle.combat_active:
+        turns += 1
+        battle.player_turn()
+        if battle.combat_active:
+            battle.enemy_turn()
+    return turns
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+def resolve_battle_fast(character, enemy, battle_class=SimpleBattle):
+    # Fight character against enemy to the end, leave both with their
+    # final health and grant the victory rewards on a win.
+    # SimpleBattle is deterministic, so the outcome is computed directly:
+    # the player needs ceil(enemy_health / strength) turns to win and
+    # survives ceil(health / ENEMY_DAMAGE) enemy turns, and the player
+    # strikes first. Subclasses (crits, special attacks...), non-integer
+    # stats or non-positive strength fall back to the turn loop.
+    # Returns {"won", "turns", "rewards"}.
+    health = character.get("health", 0)
+    damage = character.get("strength", PLAYER_DEFAULT_DAMAGE)
+    enemy_health = enemy.get("health", 0)
+
+    closed_form = (
+        battle_class is SimpleBattle
+        and type(health) is int
+        and type(damage) is int
+        and type(enemy_health) is int
+        and damage > 0
+    )
+    if not closed_form:
+        turns = run_battle(battle_class(character, enemy))
+        won = enemy.get("health", 0) <= 0
+    else:
+        turns_to_win = max(1, _ceil_div(enemy_health, damage))
+        turns_to_lose = max(1, _ceil_div(health, ENEMY_DAMAGE))
+        won = turns_to_win <= turns_to_lose
+        if won:
+            turns = turns_to_win
+            enemy["health"] = 0
+            if turns > 1:
+                character["health"] = health - ENEMY_DAMAGE * (turns - 1)
+        else:
+            turns = turns_to_lose
+            enemy["health"] = enemy_health - damage * turns
+            character["health"] = 0
+
+    rewards = {"xp": 0, "gold": 0}
+    if won and character.get("health", 0) > 0:
+        rewards = get_victory_rewards(enemy)
+        gain_experience(character, rewards["xp"])
+        add_gold(character, rewards["gold"])
+    return {"won": won, "turns": turns, "rewards": rewards}
+
+
+def simulate_battles(characters, enemies):
+    # Fight characters[i] against enemies[i] for every i, with the same
+    # rules as SimpleBattle (player_turn, then enemy_turn, until one side
+    # is at 0 health). All battles advance one turn per pass over column
+    # arrays, and finished battles drop out of the active list.
+    # The inputs are not modified. Returns one result per battle:
+    # {"won", "turns", "character_health", "enemy_health", "rewards"}.
+    count = len(characters)
+    if len(enemies) != count:
+        raise CombatError("Need exactly one enemy per character.")
+
+    char_health = array("q", [c.get("health", 0) for c in characters])
+    damage = array(
+        "q", [c.get("strength", PLAYER_DEFAULT_DAMAGE) for c in characters]
+    )
+    enemy_health = array("q", [e.get("health", 0) for e in enemies])
+    turns = array("q", [0]) * count
+    won = bytearray(count)
+
+    active = list(range(count))
+    turn = 0
+    while active:
+        turn += 1
+        still_fighting = []
+        for i in active:
+            health = enemy_health[i] - damage[i]
+            if health <= 0:
+                enemy_health[i] = 0
+                won[i] = 1
+                turns[i] = turn
+                continue
+            enemy_health[i] = health
+
+            health = char_health[i] - ENEMY_DAMAGE
+            if health <= 0:
+                char_health[i] = 0
+                turns[i] = turn
+                continue
+            char_health[i] = health
+            still_fighting.append(i)
+        active = still_fighting
+
+    results = []
+    for i in range(count):
+        if won[i]:
+            rewards = get_victory_rewards(enemies[i])
+        else:
+            rewards = {"xp": 0, "gold": 0}
+        results.append({
+            "won": bool(won[i]),
+            "turns": turns[i],
+            "character_health": char_health[i],
+            "enemy_health": enemy_health[i],
+            "rewards": rewards,
+        })
+    return results
+
+
+# ---------------- PARALLEL BATTLES ----------------
+
+# Character fields a battle can read or change; only these cross the
+# process boundary.
+_BATTLE_FIELDS = ("health", "max_health", "strength", "level", "experience", "gold")
+_BATTLE_DEFAULTS = (0, 0, PLAYER_DEFAULT_DAMAGE, 1, 0, 0)
+
+
+def _battle_state(character):
+    return tuple(
+        character.get(key, default)
+        for key, default in zip(_BATTLE_FIELDS, _BATTLE_DEFAULTS)
+    )
+
+
+def _enemy_stats(template):
+    # What a worker needs to fight an enemy: (health, xp, gold).
+    return template.health, template.xp_reward, template.gold_reward
+
+
+def _resolve_group(group):
+    # One character's battles, in order. Returns (final state, results).
+    # Enemies arrive as _enemy_stats tuples, so workers never read their
+    # own (possibly stale) copy of the enemy catalog.
+    state, enemy_stats = group
+    character = dict(zip(_BATTLE_FIELDS, state))
+    templates = {}
+    results = []
+    for stats in enemy_stats:
+        template = templates.get(stats)
+        if template is None:
+            health, xp_reward, gold_reward = stats
+            template = templates[stats] = EnemyTemplate(None, {
+                "name": "",
+                "health": health,
+                "xp_reward": xp_reward,
+                "gold_reward": gold_reward,
+            })
+        results.append(resolve_battle_fast(character, Enemy(template)))
+    return _battle_state(character), results
+
+
+def _resolve_chunk(groups):
+    return [_resolve_group(group) for group in groups]
+
+
+class BattleScheduler:
+    # Resolves a stream of (character, enemy_type) jobs with SimpleBattle
+    # rules (see resolve_battle_fast) on a pool of worker processes.
+    #
+    # Jobs for the same character stay together and run in order, so a
+    # character fighting several enemies gets the same result as running
+    # them one after another. Only the numeric battle fields are sent to
+    # the workers. Jobs are packed into chunks of about chunk_size so each
+    # round trip carries enough work, and the final stats are written back
+    # onto the original characters. Small batches run inline, because the
+    # IPC would cost more than the battles.
+
+    def __init__(self, max_workers=None, chunk_size=None, inline_threshold=256):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.inline_threshold = inline_threshold
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def _chunks(self, groups, job_count):
+        size = self.chunk_size or max(1, _ceil_div(job_count, self.max_workers * 4))
+        chunk = []
+        jobs_in_chunk = 0
+        for group in groups:
+            chunk.append(group)
+            jobs_in_chunk += len(group[1])
+            if jobs_in_chunk >= size:
+                yield chunk
+                chunk = []
+                jobs_in_chunk = 0
+        if chunk:
+            yield chunk
+
+    def run(self, jobs):
+        # Resolve all jobs; returns one result per job, in job order.
+        jobs = list(jobs)
+        # Enemy stats come from this process's current catalog.
+        stats = {}
+        for _, enemy_type in jobs:
+            if enemy_type not in stats:
+                if not isinstance(enemy_type, str):
+                    raise InvalidTargetError("Unknown enemy type: " + str(enemy_type))
+                stats[enemy_type] = _enemy_stats(get_enemy_template(enemy_type))
+
+        # Group by character identity, keeping each character's job order.
+        by_character = {}
+        for index, (character, enemy_type) in enumerate(jobs):
+            entry = by_character.get(id(character))
+            if entry is None:
+                entry = by_character[id(character)] = (character, [], [])
+            entry[1].append(stats[enemy_type])
+            entry[2].append(index)
+
+        entries = list(by_character.values())
+        groups = [(_battle_state(c), types) for c, types, _ in entries]
+
+        if len(jobs) < self.inline_threshold or self.max_workers == 1:
+            outcomes = [_resolve_group(group) for group in groups]
+        else:
+            outcomes = []
+            pool = self._get_pool()
+            for chunk_outcomes in pool.map(
+                _resolve_chunk, self._chunks(groups, len(jobs))
+            ):
+                outcomes.extend(chunk_outcomes)
+
+        results = [None] * len(jobs)
+        for (character, _, indexes), (state, group_results) in zip(entries, outcomes):
+            before = _battle_state(character)
+            for key, old, new in zip(_BATTLE_FIELDS, before, state):
+                if old != new:
+                    character[key] = new
+            for index, result in zip(indexes, group_results):
+                results[index] = result
+        return results
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,4 +1,11 @@
+import hashlib
+import io
 import os
+import pickle
+import re
+import threading
+from array import array
+from collections.abc import Mapping
 from custom_exceptions import (
     DataError,
     InvalidDataFormatError,
@@ -6,71 +13,223 @@ from custom_exceptions import (
 )
 
 
-def load_quests(path="data/quests.txt"):
+# Each schema lists (FILE_KEY, record_key, coerce) in record order.
+# A block becomes a record only when it has every FILE_KEY and every
+# coercion succeeds, otherwise the block is skipped.
+class RecordSchema:
+
+    def __init__(self, id_key, fields):
+        self.id_key = id_key
+        self.fields = tuple(fields)
+        self.required = frozenset(key for key, _, _ in self.fields)
+        self.record_id = next(
+            name for key, name, _ in self.fields if key == id_key
+        )
+        # Stored in the compiled cache so a schema change invalidates it.
+        self.signature = tuple(
+            (key, name, coerce.__name__) for key, name, coerce in self.fields
+        )
 
-    if not os.path.exists(path):
-        raise MissingDataFileError("Quest file not found: " + path)
 
-    quests = {}
+QUEST_SCHEMA = RecordSchema("QUEST_ID", [
+    ("QUEST_ID", "quest_id", str),
+    ("TITLE", "title", str),
+    ("DESCRIPTION", "description", str),
+    ("REWARD_XP", "reward_xp", int),
+    ("REWARD_GOLD", "reward_gold", int),
+    ("REQUIRED_LEVEL", "required_level", int),
+    ("PREREQUISITE", "prerequisite", str),
+])
+
+def parse_effect(text):
+    # Compile an EFFECT string into ((stat, op, magnitude), ...).
+    # "health:20" adds 20 health, "strength:=12" sets strength to 12 and
+    # several effects are separated by commas: "health:10,magic:2".
+    # Entries without a numeric magnitude are ignored.
+    effects = []
+    for part in text.split(","):
+        stat, sep, value = part.partition(":")
+        if not sep:
+            continue
+        value = value.strip()
+        op = "add"
+        if value.startswith("="):
+            op = "set"
+            value = value[1:]
+        try:
+            effects.append((stat.strip(), op, int(value)))
+        except ValueError:
+            continue
+    return tuple(effects)
+
+
+ITEM_SCHEMA = RecordSchema("ITEM_ID", [
+    ("ITEM_ID", "item_id", str),
+    ("NAME", "name", str),
+    ("TYPE", "type", str),
+    ("EFFECT", "effect", str),
+    ("COST", "cost", int),
+    ("DESCRIPTION", "description", str),
+    ("EFFECT", "effects", parse_effect),
+])
+
+ENEMY_SCHEMA = RecordSchema("ENEMY_ID", [
+    ("ENEMY_ID", "enemy_id", str),
+    ("NAME", "name", str),
+    ("HEALTH", "health", int),
+    ("XP_REWARD", "xp_reward", int),
+    ("GOLD_REWARD", "gold_reward", int),
+])
+
+# Blocks are separated by one or more blank (or whitespace only) lines.
+_BLOCK_SEPARATOR = re.compile(r"\n\s*\n")
+_BLOCK_SEPARATOR_BYTES = re.compile(rb"\n\s*\n")
+_READ_CHUNK_SIZE = 1 << 20
+
+
+def _iter_blocks(f):
+    # Yield raw block text, reading the file in large chunks.
+    pending = ""
+    while True:
+        chunk = f.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        pieces = _BLOCK_SEPARATOR.split(pending + chunk)
+        # The last piece may continue in the next chunk.
+        pending = pieces.pop()
+        for block in pieces:
+            yield block
+    yield pending
+
+
+def _parse_block(block, schema):
+    # Turn one block of KEY: value lines into a record, or None if invalid.
     current = {}
+    for line in block.split("\n"):
+        key, sep, value = line.partition(":")
+        if sep:
+            current[key.strip().upper()] = value.strip()
+
+    if not schema.required.issubset(current):
+        return None
+
+    try:
+        return {name: coerce(current[key]) for key, name, coerce in schema.fields}
+    except ValueError:
+        return None
 
-    # add processed quest if valid
-    def commit_current(line_num):
-        if not current:
-            return
-        required_fields = [
-            "QUEST_ID",
-            "TITLE",
-            "DESCRIPTION",
-            "REWARD_XP",
-            "REWARD_GOLD",
-            "REQUIRED_LEVEL",
-            "PREREQUISITE",
-        ]
-
-        # Must contain all fields
-        if all(k in current for k in required_fields):
-            try:
-                qid = current["QUEST_ID"]
-                quests[qid] = {
-                    "quest_id": qid,
-                    "title": current["TITLE"],
-                    "description": current["DESCRIPTION"],
-                    "reward_xp": int(current["REWARD_XP"]),
-                    "reward_gold": int(current["REWARD_GOLD"]),
-                    "required_level": int(current["REQUIRED_LEVEL"]),
-                    "prerequisite": current["PREREQUISITE"],
-                }
-            except ValueError:
-
-                pass
-
-        # Reset for next block
-        current.clear()
 
+def _parse_records(f, schema):
+    # Parse every valid block of an open text file into {id: record}.
+    records = {}
+    id_key = schema.record_id
+    for block in _iter_blocks(f):
+        record = _parse_block(block, schema)
+        if record is not None:
+            records[record[id_key]] = record
+    return records
+
+
+# Compiled cache written next to each source file as <path>.cache: a
+# digest of the pickled payload followed by the payload itself.
+# Bump CACHE_VERSION whenever the parsing rules or the layout change.
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".cache"
+_DIGEST_SIZE = 16
+
+
+def _source_digest(data):
+    return hashlib.blake2b(data, digest_size=_DIGEST_SIZE).digest()
+
+
+def _read_cache(cache_path, schema):
+    # Return (mtime_ns, size, digest, records) or None if unusable.
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    payload = data[_DIGEST_SIZE:]
+    if data[:_DIGEST_SIZE] != _source_digest(payload):
+        return None
+    # The digest catches damage; anything else a bad payload raises
+    # (MemoryError, OverflowError, ...) still just means rebuild.
+    try:
+        entry = pickle.loads(payload)
+        version, signature, mtime_ns, size, digest, records = entry
+    except Exception:
+        return None
+    if version != CACHE_VERSION or signature != schema.signature:
+        return None
+    if not isinstance(records, dict):
+        return None
+    return mtime_ns, size, digest, records
+
+
+def _write_cache(cache_path, schema, stat, digest, records):
+    # Best effort, a read-only data directory just means no cache.
+    entry = (
+        CACHE_VERSION,
+        schema.signature,
+        stat.st_mtime_ns,
+        stat.st_size,
+        digest,
+        records,
+    )
+    # Per process and thread, so servers starting together on a cache
+    # miss never write the same temp file.
+    tmp_path = cache_path + ".%d.%d.tmp" % (os.getpid(), threading.get_ident())
     try:
+        payload = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        with open(tmp_path, "wb") as f:
+            f.write(_source_digest(payload))
+            f.write(payload)
+        os.replace(tmp_path, cache_path)
+    except (OSError, pickle.PicklingError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _load_records(path, schema, use_cache=True):
+    # Parse path, going through the compiled cache when allowed.
+    if not use_cache:
         with open(path, "r") as f:
-            for line_num, raw in enumerate(f, start=1):
-                line = raw.strip()
+            return _parse_records(f, schema)
 
-                # Blank line = end of block
-                if line == "":
-                    commit_current(line_num)
-                    continue
+    cache_path = path + CACHE_SUFFIX
+    cached = _read_cache(cache_path, schema)
 
-                if ":" not in line:
+    # The source is hashed on every load: an edit that keeps mtime and
+    # size (coarse timestamps, mtime restored by a sync tool) still
+    # misses. Hashing is cheap next to parsing.
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    digest = _source_digest(data)
 
-                    continue
+    if cached is not None and cached[2] == digest:
+        if cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[3]
+        # Only touched, refresh the stamp.
+        records = cached[3]
+    else:
+        text = data.decode("utf-8")
+        records = _parse_records(io.StringIO(text, newline=None), schema)
 
-                key, value = line.split(":", 1)
-                key = key.strip().upper()
-                value = value.strip()
+    if records:
+        _write_cache(cache_path, schema, stat, digest, records)
+    return records
 
-                current[key] = value
 
-            #
-            commit_current(line_num)
+def load_quests(path="data/quests.txt", use_cache=True):
 
+    if not os.path.exists(path):
+        raise MissingDataFileError("Quest file not found: " + path)
+
+    try:
+        quests = _load_records(path, QUEST_SCHEMA, use_cache)
     except OSError:
         raise DataError("Error reading quest file: " + path)
 
@@ -83,69 +242,138 @@ def load_quests(path="data/quests.txt"):
 
 
 
-def load_items(path="data/items.txt"):
+def load_items(path="data/items.txt", use_cache=True):
 
 
     if not os.path.exists(path):
         raise MissingDataFileError("Item file not found: " + path)
 
-    items = {}
-    current = {}
+    try:
+        items = _load_records(path, ITEM_SCHEMA, use_cache)
+    except OSError:
+        raise DataError("Error reading item file: " + path)
 
-    def commit_current(line_num):
-        # Validate and store current item block if valid then reset.
-        if not current:
-            return
+    if not items:
+        raise InvalidDataFormatError("No valid item data found in: " + path)
 
-        required_fields = [
-            "ITEM_ID",
-            "NAME",
-            "TYPE",
-            "EFFECT",
-            "COST",
-            "DESCRIPTION",
-        ]
-
-        if all(k in current for k in required_fields):
-            try:
-                item_id = current["ITEM_ID"]
-                items[item_id] = {
-                    "item_id": item_id,
-                    "name": current["NAME"],
-                    "type": current["TYPE"],
-                    "effect": current["EFFECT"],
-                    "cost": int(current["COST"]),
-                    "description": current["DESCRIPTION"],
-                }
-            except ValueError:
-                # bad COST value skip this block
-                pass
-
-        current.clear()
+    return items
 
-    try:
-        with open(path, "r") as f:
-            for line_num, raw in enumerate(f, start=1):
-                line = raw.strip()
 
-                # Blank line end of an item block
-                if line == "":
-                    commit_current(line_num)
-                    continue
+def load_enemies(path="data/enemies.txt", use_cache=True):
+
+    if not os.path.exists(path):
+        raise MissingDataFileError("Enemy file not found: " + path)
 
+    try:
+        enemies = _load_records(path, ENEMY_SCHEMA, use_cache)
+    except OSError:
+        raise DataError("Error reading enemy file: " + path)
+
+    if not enemies:
+        raise InvalidDataFormatError("No valid enemy data found in: " + path)
+
+    for enemy in enemies.values():
+        validate_enemy_data(enemy)
+    return enemies
+
+
+class LazyCatalog(Mapping):
+    # Read-only {id: record} mapping over a private in-memory copy of a
+    # data file. Only the byte range of each valid block is indexed; a
+    # record is decoded on first access and cached after that. The copy
+    # is taken once at open, so editing or truncating the file afterwards
+    # (hot reload invites in-place edits) cannot change what an open
+    # catalog returns.
+
+    def __init__(self, path, schema):
+        self.path = path
+        self._schema = schema
+        self._index = {}
+        self._starts = array("q")
+        self._ends = array("q")
+        self._records = {}
+
+        with open(path, "rb") as f:
+            self._data = f.read()
+        self._build_index()
+
+    def _build_index(self):
+        # One validating pass over the file, keeping only offsets.
+        id_key = self._schema.record_id
+        start = 0
+        for match in _BLOCK_SEPARATOR_BYTES.finditer(self._data):
+            self._add_block(start, match.start(), id_key)
+            start = match.end()
+        self._add_block(start, len(self._data), id_key)
+
+    def _add_block(self, start, end, id_key):
+        record = _parse_block(self._decode(start, end), self._schema)
+        if record is None:
+            return
+        record_id = record[id_key]
+        position = self._index.get(record_id)
+        if position is None:
+            self._index[record_id] = len(self._starts)
+            self._starts.append(start)
+            self._ends.append(end)
+        else:
+            # Later duplicates win, like the eager loaders.
+            self._starts[position] = start
+            self._ends[position] = end
+
+    def _decode(self, start, end):
+        return self._data[start:end].decode("utf-8")
+
+    def __getitem__(self, record_id):
+        record = self._records.get(record_id)
+        if record is None:
+            position = self._index[record_id]
+            text = self._decode(self._starts[position], self._ends[position])
+            record = _parse_block(text, self._schema)
+            if record is None or record[self._schema.record_id] != record_id:
+                # Only reachable after close() drops the copy.
+                raise DataError("Catalog is closed: " + self.path)
+            self._records[record_id] = record
+        return record
+
+    def __contains__(self, record_id):
+        return record_id in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        self._data = b""
+
+
+def open_quest_catalog(path="data/quests.txt"):
+    # Lazy drop-in for load_quests.
+    if not os.path.exists(path):
+        raise MissingDataFileError("Quest file not found: " + path)
 
-                if ":" not in line:
+    try:
+        quests = LazyCatalog(path, QUEST_SCHEMA)
+    except OSError:
+        raise DataError("Error reading quest file: " + path)
 
-                    continue
+    if not quests:
+        raise InvalidDataFormatError(
+            "No valid quest entries found in: " + path
+        )
 
-                key, value = line.split(":", 1)
-                key = key.strip().upper()
-                value = value.strip()
-                current[key] = value
+    return quests
 
 
-            commit_current(line_num)
+def open_item_catalog(path="data/items.txt"):
+    # Lazy drop-in for load_items.
+    if not os.path.exists(path):
+        raise MissingDataFileError("Item file not found: " + path)
 
+    try:
+        items = LazyCatalog(path, ITEM_SCHEMA)
     except OSError:
         raise DataError("Error reading item file: " + path)
 
@@ -155,6 +383,161 @@ def load_items(path="data/items.txt"):
     return items
 
 
+class LiveCatalog(Mapping):
+    # {id: record} mapping that can be reloaded while the game runs.
+    # The first load goes through the compiled cache like load_quests.
+    # reload() re-reads the file but only parses blocks whose text changed
+    # since the last reload, then swaps in the new dict with one
+    # assignment. Readers see either the old or the new catalog, never a
+    # mix. A reload that fails (missing file, no valid records, validate
+    # raising) keeps the current catalog.
+
+    def __init__(self, path, schema, validate=None):
+        self.path = path
+        self._schema = schema
+        self._validate = validate
+        # Block text -> record, filled in by the first reload.
+        self._blocks = None
+        self.version = 0
+        self.last_error = None
+
+        if not os.path.exists(path):
+            raise MissingDataFileError("Data file not found: " + path)
+        try:
+            stamp = self._current_stamp()
+            records = _load_records(path, schema)
+        except OSError:
+            raise DataError("Error reading data file: " + path)
+        if not records:
+            raise InvalidDataFormatError("No valid entries found in: " + path)
+        if validate is not None:
+            for record in records.values():
+                validate(record)
+        self._records = records
+        self._stamp = stamp
+        self.version = 1
+
+    def _current_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        try:
+            return self._current_stamp() != self._stamp
+        except OSError:
+            return False
+
+    def reload(self):
+        # Raises DataError subclasses if the new file cannot be used.
+        if not os.path.exists(self.path):
+            raise MissingDataFileError("Data file not found: " + self.path)
+
+        id_key = self._schema.record_id
+        old_blocks = self._blocks or {}
+        # Until blocks are known, unchanged records are matched by value so
+        # readers keep the same record objects.
+        old_records = self._records if self._blocks is None else {}
+        blocks = {}
+        records = {}
+        try:
+            stamp = self._current_stamp()
+            with open(self.path, "r") as f:
+                for block in _iter_blocks(f):
+                    # Trailing newlines depend on what follows the block.
+                    block = block.strip()
+                    if block in old_blocks:
+                        record = old_blocks[block]
+                    else:
+                        record = _parse_block(block, self._schema)
+                        if record is not None:
+                            old = old_records.get(record[id_key])
+                            if old == record:
+                                record = old
+                            elif self._validate is not None:
+                                self._validate(record)
+                    blocks[block] = record
+                    if record is not None:
+                        records[record[id_key]] = record
+        except OSError:
+            raise DataError("Error reading data file: " + self.path)
+
+        if not records:
+            raise InvalidDataFormatError("No valid entries found in: " + self.path)
+
+        self._records = records
+        self._blocks = blocks
+        self._stamp = stamp
+        self.version += 1
+
+    def reload_if_changed(self):
+        # Returns True if a new version was swapped in.
+        if not self.changed():
+            return False
+        try:
+            self.reload()
+        except DataError as e:
+            self.last_error = str(e)
+            return False
+        self.last_error = None
+        return True
+
+    def __getitem__(self, record_id):
+        return self._records[record_id]
+
+    def __contains__(self, record_id):
+        return record_id in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+
+class CatalogWatcher:
+    # Polls LiveCatalogs for changed files (mtime/size) and reloads them,
+    # either on demand with poll() or from a background thread.
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._watched = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, catalog, on_reload=None):
+        # on_reload(catalog) runs after each successful reload.
+        self._watched.append((catalog, on_reload))
+        return catalog
+
+    def poll(self):
+        # Reload changed catalogs; returns the ones that were reloaded.
+        reloaded = []
+        for catalog, on_reload in self._watched:
+            if catalog.reload_if_changed():
+                reloaded.append(catalog)
+                if on_reload is not None:
+                    on_reload(catalog)
+        return reloaded
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="catalog-watcher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
 def validate_quest_data(data):
 
     if not isinstance(data, dict):
@@ -206,3 +589,35 @@ def validate_item_data(data):
         raise InvalidDataFormatError("Item cost must be numeric.")
 
     return True
+
+
+def validate_enemy_data(data):
+
+    if not isinstance(data, dict):
+        raise InvalidDataFormatError("Enemy data must be a dict.")
+
+    required_keys = [
+        "enemy_id",
+        "name",
+        "health",
+        "xp_reward",
+        "gold_reward",
+    ]
+    for key in required_keys:
+        if key not in data:
+            raise InvalidDataFormatError("Enemy missing key: " + key)
+
+    try:
+        health = int(data["health"])
+        xp = int(data["xp_reward"])
+        gold = int(data["gold_reward"])
+    except (ValueError, TypeError):
+        raise InvalidDataFormatError("Enemy has non-numeric stats.")
+
+    if health <= 0 or xp < 0 or gold < 0:
+        raise InvalidDataFormatError(
+            "Enemy needs positive health and non-negative rewards: "
+            + str(data["enemy_id"])
+        )
+
+    return True
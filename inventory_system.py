@@ -5,17 +5,148 @@ from custom_exceptions import (
     InsufficientResourcesError,
     InvalidItemTypeError,
 )
+from character_manager import mark_dirty, set_untracked
+from game_data import parse_effect
 
 
 MAX_INVENTORY_SIZE = 20
 
+
+def _check_quantity(quantity):
+    if not isinstance(quantity, int) or quantity <= 0:
+        raise ValueError("Quantity must be a positive integer: " + repr(quantity))
+
+
+class Inventory:
+    # Inventory stored as stacks {item: quantity}. Membership, add, remove
+    # and count are O(1). len() is the total number of items, so
+    # MAX_INVENTORY_SIZE means the same thing as it did with the list.
+    # Iterating yields one entry per item (stacks in insertion order),
+    # which is also how it saves: the same list of item names as before.
+
+    __slots__ = ("_counts", "_size")
+
+    def __init__(self, items=()):
+        self._counts = {}
+        self._size = 0
+        for item in items:
+            self.add(item)
+
+    def add(self, item, quantity=1):
+        # Raises ValueError unless quantity is a positive integer.
+        _check_quantity(quantity)
+        self._counts[item] = self._counts.get(item, 0) + quantity
+        self._size += quantity
+
+    append = add
+
+    def remove(self, item, quantity=1):
+        # Raises ValueError like list.remove if there are not enough.
+        _check_quantity(quantity)
+        have = self._counts.get(item, 0)
+        if have < quantity:
+            raise ValueError("Not enough of item: " + str(item))
+        if have == quantity:
+            del self._counts[item]
+        else:
+            self._counts[item] = have - quantity
+        self._size -= quantity
+
+    def count(self, item):
+        return self._counts.get(item, 0)
+
+    def stacks(self):
+        # [(item, quantity), ...]
+        return list(self._counts.items())
+
+    def __contains__(self, item):
+        return item in self._counts
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for item, quantity in self._counts.items():
+            for _ in range(quantity):
+                yield item
+
+    def __eq__(self, other):
+        # Compared as a multiset, so a saved-and-loaded list still matches.
+        if isinstance(other, Inventory):
+            return self._counts == other._counts
+        if isinstance(other, (list, tuple)):
+            return self == Inventory(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Inventory(" + repr(list(self)) + ")"
+
+
 def _get_inventory(character):
     inv = character.get("inventory")
     if inv is None:
-        inv = []
+        inv = Inventory()
         character["inventory"] = inv
+    elif not isinstance(inv, Inventory):
+        inv = Inventory(inv)
+        set_untracked(character, "inventory", inv)
     return inv
 
+
+def count_item(character, item_name):
+    # How many of item_name the character carries.
+    return _get_inventory(character).count(item_name)
+
+# ---------------- ITEM EFFECTS ----------------
+
+# Items from load_items carry "effects" compiled by game_data.parse_effect.
+# Hand-made item dicts with only an "effect" string are compiled once here.
+_compiled_effects = {}
+
+
+def _get_effects(item_data):
+    effects = item_data.get("effects")
+    if effects is None:
+        text = item_data.get("effect", "")
+        effects = _compiled_effects.get(text)
+        if effects is None:
+            effects = parse_effect(text)
+            _compiled_effects[text] = effects
+    return effects
+
+
+def _apply_health(character, op, value):
+    # Healing never goes past max_health.
+    current = character.get("health", 0)
+    max_health = character.get("max_health", current)
+    health = value if op == "set" else current + value
+    character["health"] = min(health, max_health)
+
+
+def _apply_stat(stat):
+    def apply(character, op, value):
+        current = character.get(stat, 0)
+        character[stat] = value if op == "set" else current + value
+    return apply
+
+
+# stat -> handler(character, op, magnitude); unknown stats are ignored.
+EFFECT_HANDLERS = {
+    "health": _apply_health,
+    "max_health": _apply_stat("max_health"),
+    "strength": _apply_stat("strength"),
+    "magic": _apply_stat("magic"),
+}
+
+
+def apply_item_effects(character, item_data):
+    for stat, op, value in _get_effects(item_data):
+        handler = EFFECT_HANDLERS.get(stat)
+        if handler is not None:
+            handler(character, op, value)
+
 #  add_item_to_inventory, remove_item_from_inventory, etc
 
 def purchase_item(character, item_name, item_data):
@@ -35,6 +166,27 @@ def add_item_to_inventory(character, item_name):
     if len(inventory) >= MAX_INVENTORY_SIZE:
         raise InventoryFullError("Inventory is full.")
     inventory.append(item_name)
+    mark_dirty(character, "inventory")
+    return True
+
+
+def free_slots(character):
+    # How many more items fit in the inventory.
+    return MAX_INVENTORY_SIZE - len(_get_inventory(character))
+
+
+def add_items_to_inventory(character, totals):
+    # Add {item_id: quantity} all at once, or raise InventoryError /
+    # InventoryFullError without adding anything.
+    for item_id, quantity in totals.items():
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise InventoryError("Quantity must be a positive integer: " + item_id)
+    inventory = _get_inventory(character)
+    if len(inventory) + sum(totals.values()) > MAX_INVENTORY_SIZE:
+        raise InventoryFullError("Not enough inventory space.")
+    for item_id, quantity in totals.items():
+        inventory.add(item_id, quantity)
+    mark_dirty(character, "inventory")
     return True
 
 
@@ -44,6 +196,7 @@ def remove_item_from_inventory(character, item_name):
     if item_name not in inventory:
         raise ItemNotFoundError("Item not found: " + item_name)
     inventory.remove(item_name)
+    mark_dirty(character, "inventory")
     return True
 
 
@@ -57,24 +210,10 @@ def use_item(character, item_name, item_data):
     if item_type != "consumable":
         raise InvalidItemTypeError("Only consumables can be used.")
 
-    effect = item_data.get("effect", "")
-
-    if ":" in effect:
-        stat, value_str = effect.split(":", 1)
-        try:
-            value = int(value_str)
-        except ValueError:
-            value = 0
-
-        if stat == "health":
-            health = character.get("health", 0)
-            max_health = character.get("max_health", health)
-            health += value
-            if health > max_health:
-                health = max_health
-            character["health"] = health
+    apply_item_effects(character, item_data)
 
     inventory.remove(item_name)
+    mark_dirty(character, "inventory")
     return True
 
 
@@ -87,17 +226,7 @@ def equip_weapon(character, item_name, item_data):
     if item_data.get("type") != "weapon":
         raise InvalidItemTypeError("Item is not a weapon.")
 
-    effect = item_data.get("effect", "")
-    if ":" in effect:
-        stat, value_str = effect.split(":", 1)
-        try:
-            value = int(value_str)
-        except ValueError:
-            value = 0
-
-        if stat == "strength":
-            character["strength"] = character.get("strength", 0) + value
-
+    apply_item_effects(character, item_data)
     character["equipped_weapon"] = item_name
     return True
 
@@ -123,4 +252,76 @@ def sell_item(character, item_name, item_data):
 
     character["gold"] = character.get("gold", 0) + gold_received
     inventory.remove(item_name)
+    mark_dirty(character, "inventory")
     return gold_received
+
+
+# ---------------- BATCH SHOP TRANSACTIONS ----------------
+
+def _aggregate_basket(basket, catalog):
+    # Merge [(item_id, quantity), ...] into {item_id: quantity}.
+    totals = {}
+    for item_id, quantity in basket:
+        if item_id not in catalog:
+            raise ItemNotFoundError("Unknown item: " + item_id)
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise InventoryError("Quantity must be a positive integer: " + item_id)
+        totals[item_id] = totals.get(item_id, 0) + quantity
+    return totals
+
+
+def purchase_items(character, basket, catalog):
+    # Buy a whole basket [(item_id, quantity), ...] at catalog prices.
+    # Gold and inventory space are checked for the entire basket first,
+    # so either everything is bought or nothing changes.
+    # Returns the total gold spent.
+    totals = _aggregate_basket(basket, catalog)
+    cost = sum(int(catalog[i].get("cost", 0)) * q for i, q in totals.items())
+
+    gold = character.get("gold", 0)
+    if gold < cost:
+        raise InsufficientResourcesError("Not enough gold to purchase items.")
+
+    inventory = _get_inventory(character)
+    if len(inventory) + sum(totals.values()) > MAX_INVENTORY_SIZE:
+        raise InventoryFullError("Not enough inventory space for purchase.")
+
+    added = []
+    try:
+        for item_id, quantity in totals.items():
+            inventory.add(item_id, quantity)
+            added.append((item_id, quantity))
+        character["gold"] = gold - cost
+    except Exception:
+        for item_id, quantity in added:
+            inventory.remove(item_id, quantity)
+        raise
+    mark_dirty(character, "inventory")
+    return cost
+
+
+def sell_items(character, basket, catalog):
+    # Sell a whole basket [(item_id, quantity), ...] for half price each.
+    # Every item must be in the inventory in the requested quantity,
+    # otherwise nothing is sold. Returns the total gold received.
+    totals = _aggregate_basket(basket, catalog)
+    inventory = _get_inventory(character)
+    for item_id, quantity in totals.items():
+        if inventory.count(item_id) < quantity:
+            raise ItemNotFoundError("Not enough in inventory: " + item_id)
+
+    received = sum(
+        int(catalog[i].get("cost", 0)) // 2 * q for i, q in totals.items()
+    )
+    removed = []
+    try:
+        for item_id, quantity in totals.items():
+            inventory.remove(item_id, quantity)
+            removed.append((item_id, quantity))
+        character["gold"] = character.get("gold", 0) + received
+    except Exception:
+        for item_id, quantity in removed:
+            inventory.add(item_id, quantity)
+        raise
+    mark_dirty(character, "inventory")
+    return received
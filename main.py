@@ -3,17 +3,53 @@ from character_manager import (
     save_character as cm_save_character,
     load_character as cm_load_character,
 )
-from game_data import load_quests, load_items
+from game_data import (
+    load_quests,
+    load_items,
+    LiveCatalog,
+    CatalogWatcher,
+    QUEST_SCHEMA,
+    ITEM_SCHEMA,
+    ENEMY_SCHEMA,
+    validate_quest_data,
+    validate_item_data,
+    validate_enemy_data,
+)
+import combat_system
 from custom_exceptions import DataError, CharacterNotFoundError
 
 
-def load_game_data():
+RELOAD_INTERVAL = 1.0
+
+
+def load_game_data(live=False):
     # Load quests and items simple wrapper for tests.
+    # live=True returns LiveCatalogs that start_hot_reload can refresh.
+    if live:
+        quests = LiveCatalog("data/quests.txt", QUEST_SCHEMA, validate_quest_data)
+        items = LiveCatalog("data/items.txt", ITEM_SCHEMA, validate_item_data)
+        return quests, items
     quests = load_quests("data/quests.txt")
     items = load_items("data/items.txt")
     return quests, items
 
 
+def start_hot_reload(quests, items, interval=RELOAD_INTERVAL):
+    # Watch the live catalogs (and the enemy file) for edits and reload
+    # them in the background. Returns the watcher; call stop() on exit.
+    watcher = CatalogWatcher(interval)
+    watcher.add(quests)
+    watcher.add(items)
+    enemies = LiveCatalog(
+        combat_system.ENEMY_DATA_PATH, ENEMY_SCHEMA, validate_enemy_data
+    )
+    combat_system.set_enemy_types(enemies)
+    # Templates are cached per type, so rebuild them after a reload.
+    watcher.add(enemies, on_reload=combat_system.set_enemy_types)
+    watcher.start()
+    return watcher
+
+
 def new_game():
     # Create a new character via user input.
     name = input("Enter your hero's name: ").strip()
@@ -42,11 +78,19 @@ def game_loop(character, quests, items):
 def main_menu():
     # Main menu entry point.
     try:
-        quests, items = load_game_data()
+        quests, items = load_game_data(live=True)
+        watcher = start_hot_reload(quests, items)
     except DataError as e:
         print("Failed to load game data:", e)
         return
+    try:
+        _play(quests, items)
+    finally:
+        watcher.stop()
+
 
+def _play(quests, items):
+    # Menu and game loop once the content is loaded.
     print("=== Quest Chronicles ===")
     print("1. New Game")
     print("2. Load Game")
@@ -6,14 +6,90 @@ from custom_exceptions import (
     QuestAlreadyCompletedError,
     QuestNotActiveError,
 )
+from character_manager import (
+    add_gold,
+    gain_experience,
+    mark_dirty,
+    set_untracked,
+)
+import heapq
+
+
+_NO_PREREQUISITE = ("NONE", "None", "", None)
+
+
+def _prerequisite(quest):
+    # The quest id this quest requires, or None.
+    prereq = quest.get("prerequisite", "NONE")
+    if prereq in _NO_PREREQUISITE:
+        return None
+    return prereq
+
+
+class QuestLog:
+    # Ordered set of quest ids. Membership, append and remove are O(1)
+    # and order is the order quests were added, so saves still write the
+    # same list as before and compare equal to it.
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, quest_ids=()):
+        self._ids = dict.fromkeys(quest_ids)
+
+    def append(self, quest_id):
+        self._ids[quest_id] = None
+
+    add = append
+
+    def remove(self, quest_id):
+        # Raises ValueError like list.remove.
+        try:
+            del self._ids[quest_id]
+        except KeyError:
+            raise ValueError("Quest not in log: " + str(quest_id))
+
+    def discard(self, quest_id):
+        self._ids.pop(quest_id, None)
+
+    def __contains__(self, quest_id):
+        return quest_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __eq__(self, other):
+        if isinstance(other, QuestLog):
+            return list(self._ids) == list(other._ids)
+        if isinstance(other, (list, tuple)):
+            return list(self._ids) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "QuestLog(" + repr(list(self._ids)) + ")"
+
+
+def _get_quest_log(character, key):
+    log = character.get(key)
+    if log is None:
+        log = QuestLog()
+        character[key] = log
+    elif not isinstance(log, QuestLog):
+        log = QuestLog(log)
+        set_untracked(character, key, log)
+    return log
 
 
 def _ensure_quest_lists(character):
-    if "active_quests" not in character:
-        character["active_quests"] = []
-    if "completed_quests" not in character:
-        character["completed_quests"] = []
-    return character["active_quests"], character["completed_quests"]
+    # (active, completed) as QuestLogs; plain lists are converted in place.
+    return (
+        _get_quest_log(character, "active_quests"),
+        _get_quest_log(character, "completed_quests"),
+    )
 
 
 def accept_quest(character, quest_id, quests):
@@ -27,8 +103,8 @@ def accept_quest(character, quest_id, quests):
     if character.get("level", 1) < required_level:
         raise InsufficientLevelError("Level too low for quest: " + quest_id)
 
-    prereq = quest.get("prerequisite", "NONE")
-    if prereq not in ("NONE", "None", "", None) and prereq not in completed:
+    prereq = _prerequisite(quest)
+    if prereq is not None and prereq not in completed:
         raise QuestRequirementsNotMetError("Prerequisite not met for quest: " + quest_id)
 
     if quest_id in completed:
@@ -36,6 +112,7 @@ def accept_quest(character, quest_id, quests):
 
     if quest_id not in active:
         active.append(quest_id)
+        mark_dirty(character, "active_quests")
 
 
 def complete_quest(character, quest_id, quests):
@@ -47,15 +124,15 @@ def complete_quest(character, quest_id, quests):
         raise QuestNotFoundError("Quest not found: " + quest_id)
 
     quest = quests[quest_id]
+    # XP first: if it is refused (dead character) the quest stays active.
+    gain_experience(character, quest.get("reward_xp", 0))
+    add_gold(character, quest.get("reward_gold", 0))
+
     active.remove(quest_id)
     if quest_id not in completed:
         completed.append(quest_id)
-
-
-    xp = quest.get("reward_xp", 0)
-    gold = quest.get("reward_gold", 0)
-    character["experience"] = character.get("experience", 0) + xp
-    character["gold"] = character.get("gold", 0) + gold
+    mark_dirty(character, "active_quests")
+    mark_dirty(character, "completed_quests")
     return True
 
 
@@ -64,6 +141,7 @@ def abandon_quest(character, quest_id):
     if quest_id not in active:
         raise QuestNotActiveError("Quest is not active: " + quest_id)
     active.remove(quest_id)
+    mark_dirty(character, "active_quests")
 
 
 def get_active_quests(character):
@@ -72,9 +150,126 @@ def get_active_quests(character):
 
 
 def get_available_quests(character, quests):
+    # Quests accept_quest would take right now. Scans every quest; a
+    # QuestBoard keeps the same answer up to date for repeated queries.
     active, completed = _ensure_quest_lists(character)
+    level = character.get("level", 1)
     available = []
-    for quest_id in quests.keys():
-        if quest_id not in active and quest_id not in completed:
-            available.append(quest_id)
+    for quest_id, quest in quests.items():
+        if quest_id in active or quest_id in completed:
+            continue
+        if level < quest.get("required_level", 1):
+            continue
+        prereq = _prerequisite(quest)
+        if prereq is not None and prereq not in completed:
+            continue
+        available.append(quest_id)
     return available
+
+
+# ---------------- QUEST INDEX ----------------
+
+class QuestIndex:
+    # Prerequisite graph of a quest catalog, built once per load.
+    #   roots          quests with no prerequisite
+    #   unlocks[id]    quests whose prerequisite is id
+    # Quests are kept in catalog order within each list. Build a new index
+    # after the catalog is reloaded.
+
+    def __init__(self, quests):
+        self.quests = quests
+        self.unlocks = {}
+        self._roots = []
+        for quest_id, quest in quests.items():
+            prereq = _prerequisite(quest)
+            if prereq is None:
+                self._roots.append(quest_id)
+            else:
+                self.unlocks.setdefault(prereq, []).append(quest_id)
+
+    def required_level(self, quest_id):
+        return self.quests[quest_id].get("required_level", 1)
+
+    def roots(self):
+        return list(self._roots)
+
+    def unlocked_by(self, quest_id):
+        return self.unlocks.get(quest_id, ())
+
+
+class QuestBoard:
+    # Available quests for one character, kept up to date as it accepts,
+    # completes and abandons quests and as it levels up, instead of
+    # rescanning the catalog. available() costs the size of its answer.
+    #
+    # A quest is "open" once its prerequisite is completed and it is
+    # neither active nor completed. Open quests the character is not yet
+    # high enough level for wait in a heap keyed by required level.
+    #
+    # Use the board's accept/complete/abandon so it sees every change;
+    # call rebuild() if the quest lists were changed some other way.
+
+    def __init__(self, index, character):
+        self.index = index
+        self.character = character
+        self.rebuild()
+
+    def rebuild(self):
+        active, completed = _ensure_quest_lists(self.character)
+        self._level = self.character.get("level", 1)
+        self._available = {}
+        self._waiting = []
+        candidates = self.index.roots()
+        for quest_id in completed:
+            candidates.extend(self.index.unlocked_by(quest_id))
+        for quest_id in candidates:
+            if quest_id not in completed and quest_id not in active:
+                self._open(quest_id)
+
+    def _open(self, quest_id):
+        required = self.index.required_level(quest_id)
+        if required <= self._level:
+            self._available[quest_id] = True
+        else:
+            heapq.heappush(self._waiting, (required, quest_id))
+
+    def _sync_level(self):
+        level = self.character.get("level", 1)
+        if level == self._level:
+            return
+        if level < self._level:
+            self.rebuild()
+            return
+        self._level = level
+        waiting = self._waiting
+        while waiting and waiting[0][0] <= level:
+            _, quest_id = heapq.heappop(waiting)
+            self._available[quest_id] = True
+
+    def available(self):
+        self._sync_level()
+        return list(self._available)
+
+    def is_available(self, quest_id):
+        self._sync_level()
+        return quest_id in self._available
+
+    def accept(self, quest_id):
+        self._sync_level()
+        accept_quest(self.character, quest_id, self.index.quests)
+        self._available.pop(quest_id, None)
+
+    def complete(self, quest_id):
+        result = complete_quest(self.character, quest_id, self.index.quests)
+        # Rewards may have levelled the character up.
+        self._sync_level()
+        active, completed = _ensure_quest_lists(self.character)
+        for unlocked in self.index.unlocked_by(quest_id):
+            if unlocked not in completed and unlocked not in active:
+                self._open(unlocked)
+        return result
+
+    def abandon(self, quest_id):
+        abandon_quest(self.character, quest_id)
+        self._sync_level()
+        self._open(quest_id)
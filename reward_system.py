@@ -0,0 +1,82 @@
+from custom_exceptions import (
+    CharacterError,
+    CharacterDeadError,
+    InventoryError,
+    InventoryFullError,
+    ItemNotFoundError,
+)
+from character_manager import level_for_experience, set_level_progress
+from inventory_system import add_items_to_inventory, free_slots
+
+
+# Rewards handed to many characters at once (world bosses, raids, events).
+# A reward is {"xp": int, "gold": int, "items": [(item_id, quantity), ...]},
+# every key optional. It is checked once for the whole batch; after that
+# a character that cannot take it is reported in the results instead of
+# raising, so one bad character never stops the rest of the batch.
+
+
+def _validate_rewards(rewards, catalog):
+    # -> (xp, gold, {item_id: quantity}); raises for a bad reward.
+    xp = rewards.get("xp", 0)
+    gold = rewards.get("gold", 0)
+    if not isinstance(xp, int) or xp < 0:
+        raise CharacterError("XP reward must be a non-negative integer.")
+    if not isinstance(gold, int) or gold < 0:
+        raise CharacterError("Gold reward must be a non-negative integer.")
+
+    items = {}
+    for item_id, quantity in rewards.get("items", ()):
+        if catalog is not None and item_id not in catalog:
+            raise ItemNotFoundError("Unknown item: " + item_id)
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise InventoryError("Quantity must be a positive integer: " + item_id)
+        items[item_id] = items.get(item_id, 0) + quantity
+    return xp, gold, items
+
+
+def apply_rewards(characters, rewards, catalog=None):
+    # Give the same rewards to every character. A character gets all of
+    # it or none of it: dead characters and characters without room for
+    # the items are skipped. If catalog is given, item ids must be in it.
+    # Returns one result per character, in order:
+    #   {"ok": True, "levels": levels gained, "error": None}
+    #   {"ok": False, "levels": 0, "error": exception instance}
+    xp, gold, items = _validate_rewards(rewards, catalog)
+    item_count = sum(items.values())
+
+    # Characters at the same (level, experience) level up the same way.
+    levels = {}
+    results = []
+    for character in characters:
+        if character.get("health", 0) <= 0:
+            results.append({
+                "ok": False,
+                "levels": 0,
+                "error": CharacterDeadError("Dead characters cannot gain rewards."),
+            })
+            continue
+        if item_count and free_slots(character) < item_count:
+            results.append({
+                "ok": False,
+                "levels": 0,
+                "error": InventoryFullError("Not enough inventory space."),
+            })
+            continue
+
+        gained = 0
+        if xp:
+            level = character.get("level", 1)
+            key = (level, character.get("experience", 0))
+            resolved = levels.get(key)
+            if resolved is None:
+                resolved = level_for_experience(level, key[1] + xp)
+                levels[key] = resolved
+            set_level_progress(character, level, resolved[0], resolved[1])
+            gained = resolved[0] - level
+        if gold:
+            character["gold"] = character.get("gold", 0) + gold
+        if items:
+            add_items_to_inventory(character, items)
+        results.append({"ok": True, "levels": gained, "error": None})
+    return results
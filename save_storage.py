@@ -0,0 +1,350 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+
+# Storage backends for character saves. A backend stores encoded save
+# bytes by character name:
+#   save_many([(name, data), ...], sync)
+#   load(name) -> bytes          (KeyError if missing)
+#   delete(name)                 (KeyError if missing)
+#   exists(name) -> bool
+#   names() -> list of names
+#   append_delta(name, data, sync)      (KeyError if no snapshot saved)
+#   load_with_deltas(name) -> (snapshot bytes, [delta bytes, ...])
+#   sync()                       (flush every write made with sync=False)
+# sync says whether this flush must reach disk (see the fsync policy in
+# character_manager). Saving a snapshot drops that character's deltas.
+
+
+def snapshot_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _fsync_dir(path):
+    # Make the renames durable; not supported on every platform.
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_atomic(entries, sync):
+    # Write [(path, data), ...] as one flush: temp files, optional fsync,
+    # then rename each over its target. Raises OSError.
+    suffix = ".%d.%d.tmp" % (os.getpid(), threading.get_ident())
+    staged = []
+    try:
+        for path, data in entries:
+            tmp_path = path + suffix
+            staged.append((tmp_path, path))
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        for tmp_path, path in staged:
+            os.replace(tmp_path, path)
+    except OSError:
+        for tmp_path, _ in staged:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        raise
+    if sync:
+        for directory in {os.path.dirname(path) for _, path in entries}:
+            _fsync_dir(directory)
+
+
+def _frame_delta(data):
+    # One delta record: crc32 of data (8 hex digits), a space, data.
+    return b"%08x " % zlib.crc32(data) + data
+
+
+def _unframe_deltas(lines):
+    # Records whose checksum matches; torn or garbled lines (a crash in
+    # the middle of an append) are treated as never written.
+    deltas = []
+    for line in lines:
+        checksum, _, data = line.partition(b" ")
+        try:
+            if len(checksum) == 8 and int(checksum, 16) == zlib.crc32(data):
+                deltas.append(data)
+        except ValueError:
+            pass
+    return deltas
+
+
+class DirectoryStore:
+    # One <name>.txt file per character under root.
+
+    SUFFIX = ".txt"
+    DELTA_SUFFIX = ".delta"
+
+    def __init__(self, root):
+        self.root = root
+        self._dir_ready = False
+        # Paths written without fsync, for sync(). Only kept while
+        # track_unsynced is on (character_manager turns it on under the
+        # "interval" fsync policy); otherwise nothing would drain them.
+        self.track_unsynced = False
+        self._unsynced = set()
+        self._unsynced_lock = threading.Lock()
+
+    def _written(self, paths, sync):
+        if not sync and self.track_unsynced:
+            with self._unsynced_lock:
+                self._unsynced.update(paths)
+
+    def path(self, name):
+        return os.path.join(self.root, name + self.SUFFIX)
+
+    def delta_path(self, name):
+        return os.path.join(self.root, name + self.DELTA_SUFFIX)
+
+    def _drop_deltas(self, name):
+        try:
+            os.remove(self.delta_path(name))
+        except FileNotFoundError:
+            pass
+
+    def _ensure_dir(self):
+        # Checked once per store instead of on every call; save_many
+        # recreates root if it is removed later.
+        if not self._dir_ready:
+            os.makedirs(self.root, exist_ok=True)
+            self._dir_ready = True
+
+    def save_many(self, entries, sync):
+        self._ensure_dir()
+        files = [(self.path(name), data) for name, data in entries]
+        try:
+            write_atomic(files, sync)
+        except FileNotFoundError:
+            # root was removed while the game ran; make it and retry once.
+            os.makedirs(self.root, exist_ok=True)
+            write_atomic(files, sync)
+        self._written([path for path, _ in files], sync)
+        for name, _ in entries:
+            self._drop_deltas(name)
+
+    def load(self, name):
+        try:
+            with open(self.path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(name)
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            raise KeyError(name)
+        self._drop_deltas(name)
+
+    def append_delta(self, name, data, sync):
+        # The delta file starts with the digest of the snapshot it applies
+        # to, so deltas left behind by a crash are never replayed onto a
+        # newer snapshot. Each record is checksummed (_frame_delta).
+        path = self.delta_path(name)
+        header = b""
+        if not os.path.exists(path):
+            header = snapshot_digest(self.load(name)).encode("ascii") + b"\n"
+        with open(path, "ab+") as f:
+            if not header and f.tell() > 0:
+                # A torn last record has no newline; end it so this
+                # record starts on a line of its own.
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    header = b"\n"
+            f.write(header + _frame_delta(data) + b"\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._written([path], sync)
+
+    def sync(self):
+        # fsync every file written with sync=False since the last sync,
+        # then their directories. Raises OSError; failed paths stay queued.
+        with self._unsynced_lock:
+            paths = self._unsynced
+            self._unsynced = set()
+        try:
+            while paths:
+                path = next(iter(paths))
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except FileNotFoundError:
+                    paths.discard(path)  # deleted or replaced since
+                    continue
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                paths.discard(path)
+        except OSError:
+            with self._unsynced_lock:
+                self._unsynced.update(paths)
+            raise
+        _fsync_dir(self.root)
+
+    def load_with_deltas(self, name):
+        snapshot = self.load(name)
+        try:
+            with open(self.delta_path(name), "rb") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return snapshot, []
+        if not lines or lines[0].decode("ascii", "replace") != snapshot_digest(snapshot):
+            return snapshot, []
+        return snapshot, _unframe_deltas(lines[1:])
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def names(self):
+        try:
+            files = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        cut = len(self.SUFFIX)
+        return [f[:-cut] for f in files if f.endswith(self.SUFFIX)]
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    # All characters in one SQLite file, keyed by name.
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS characters ("
+            "name TEXT PRIMARY KEY, data BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS deltas ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "name TEXT NOT NULL, data BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS deltas_by_name ON deltas (name, seq)"
+        )
+        self._conn.commit()
+        self._synchronous = None
+
+    def _set_sync(self, sync):
+        # FULL syncs every commit, OFF leaves it to the OS.
+        mode = "FULL" if sync else "OFF"
+        if mode != self._synchronous:
+            self._conn.execute("PRAGMA synchronous=" + mode)
+            self._synchronous = mode
+
+    def save_many(self, entries, sync):
+        with self._lock:
+            try:
+                self._set_sync(sync)
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO characters (name, data) "
+                        "VALUES (?, ?)",
+                        entries,
+                    )
+                    self._conn.executemany(
+                        "DELETE FROM deltas WHERE name = ?",
+                        [(name,) for name, _ in entries],
+                    )
+            except sqlite3.Error as e:
+                raise OSError(str(e))
+
+    def _execute(self, sql, params=(), commit=False):
+        # Run one statement; sqlite errors surface as OSError like files.
+        with self._lock:
+            try:
+                if commit:
+                    with self._conn:
+                        return self._conn.execute(sql, params)
+                return self._conn.execute(sql, params).fetchall()
+            except sqlite3.Error as e:
+                raise OSError(str(e))
+
+    def load(self, name):
+        rows = self._execute("SELECT data FROM characters WHERE name = ?", (name,))
+        if not rows:
+            raise KeyError(name)
+        return bytes(rows[0][0])
+
+    def delete(self, name):
+        cursor = self._execute(
+            "DELETE FROM characters WHERE name = ?", (name,), commit=True
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(name)
+        self._execute("DELETE FROM deltas WHERE name = ?", (name,), commit=True)
+
+    def append_delta(self, name, data, sync):
+        if not self.exists(name):
+            raise KeyError(name)
+        with self._lock:
+            try:
+                self._set_sync(sync)
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT INTO deltas (name, data) VALUES (?, ?)",
+                        (name, data),
+                    )
+            except sqlite3.Error as e:
+                raise OSError(str(e))
+
+    def load_with_deltas(self, name):
+        # Both reads under the lock so a save from another thread cannot
+        # slip between the snapshot and its deltas.
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM characters WHERE name = ?", (name,)
+                ).fetchone()
+                rows = self._conn.execute(
+                    "SELECT data FROM deltas WHERE name = ? ORDER BY seq",
+                    (name,),
+                ).fetchall()
+            except sqlite3.Error as e:
+                raise OSError(str(e))
+        if row is None:
+            raise KeyError(name)
+        return bytes(row[0]), [bytes(r[0]) for r in rows]
+
+    def sync(self):
+        # Commits made with synchronous=OFF reach disk with a full
+        # checkpoint under synchronous=FULL.
+        with self._lock:
+            try:
+                self._set_sync(True)
+                self._conn.execute("PRAGMA wal_checkpoint(FULL)")
+            except sqlite3.Error as e:
+                raise OSError(str(e))
+
+    def exists(self, name):
+        return bool(self._execute("SELECT 1 FROM characters WHERE name = ?", (name,)))
+
+    def names(self):
+        return [row[0] for row in self._execute("SELECT name FROM characters")]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -40,6 +40,200 @@ def test_character_creation_and_saving():
     # Cleanup
     character_manager.delete_character("IntegrationTest")
 
+def test_save_formats_round_trip():
+    """Test that both save formats and old saves decode to the same dict"""
+    char = character_manager.create_character("FormatTest", "Rogue")
+    char['inventory'] = ['health_potion', 'iron_sword', 'health_potion']
+    char['completed_quests'] = ['first_steps']
+    char['equipped_weapon'] = 'iron_sword'
+
+    for fmt in ("json", "binary"):
+        data = character_manager.encode_character(char, fmt)
+        assert character_manager.decode_character(data) == char
+
+    legacy = str(char).encode("utf-8")
+    assert character_manager.decode_character(legacy) == char
+
+    with pytest.raises(ValueError):
+        character_manager.decode_character(b"__import__('os').getcwd()")
+
+    from custom_exceptions import DataError
+    char['gold'] = 2 ** 63
+    with pytest.raises(DataError):
+        character_manager.save_character(char, "binary")
+
+def test_batch_save_is_atomic(tmp_path, monkeypatch):
+    """Test saving many characters in one flush leaves no temp files"""
+    monkeypatch.setattr(character_manager, "SAVE_DIR", str(tmp_path))
+    monkeypatch.setattr(character_manager, "FSYNC_POLICY", "never")
+
+    chars = [character_manager.create_character("Batch%d" % i, "Mage")
+             for i in range(5)]
+    chars[0]['gold'] = 999
+    assert character_manager.save_characters(chars) == 5
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        "Batch%d.txt" % i for i in range(5)
+    )
+    assert character_manager.load_character("Batch0")['gold'] == 999
+
+def test_save_recreates_removed_save_dir(tmp_path, monkeypatch):
+    """Test saving after the save directory is removed mid-game"""
+    import shutil
+    save_dir = tmp_path / "saves"
+    monkeypatch.setattr(character_manager, "SAVE_DIR", str(save_dir))
+    char = character_manager.create_character("Rebuilt", "Rogue")
+    assert character_manager.save_character(char) == True
+
+    shutil.rmtree(save_dir)
+    char['gold'] = 77
+    assert character_manager.save_character(char) == True
+    assert character_manager.load_character("Rebuilt")['gold'] == 77
+
+def test_interval_fsync_covers_every_write(tmp_path, monkeypatch):
+    """Test writes skipped by the interval policy are synced later"""
+    import time
+    import save_storage
+    monkeypatch.setattr(character_manager, "SAVE_DIR", str(tmp_path))
+    monkeypatch.setattr(character_manager, "_last_fsync", time.monotonic())
+    character_manager.set_fsync_policy("interval", 50)
+    try:
+        synced = []
+        real_sync = save_storage.DirectoryStore.sync
+        def sync(store):
+            synced.append(set(store._unsynced))
+            real_sync(store)
+        monkeypatch.setattr(save_storage.DirectoryStore, "sync", sync)
+
+        char = character_manager.create_character("Interval", "Mage")
+        character_manager.save_character(char)  # inside the interval
+        assert synced == []
+        time.sleep(0.3)
+        assert synced == [{str(tmp_path / "Interval.txt")}]
+        assert character_manager.get_storage()._unsynced == set()
+
+        # Other policies never drain the queue, so they do not fill it.
+        for policy in ("never", "always"):
+            character_manager.set_fsync_policy(policy)
+            character_manager.save_character(char)
+            char['gold'] += 1
+            character_manager.save_character_delta(char)
+            assert character_manager.get_storage()._unsynced == set()
+    finally:
+        character_manager.set_fsync_policy("always")
+
+def test_sqlite_storage_backend(tmp_path):
+    """Test saving, listing and deleting through the SQLite backend"""
+    import save_storage
+    from custom_exceptions import CharacterNotFoundError
+
+    store = save_storage.SQLiteStore(str(tmp_path / "saves.db"))
+    character_manager.set_storage(store)
+    try:
+        char = character_manager.create_character("SqlTest", "Cleric")
+        assert character_manager.save_character(char) == True
+        assert character_manager.load_character("SqlTest") == char
+        assert character_manager.list_characters() == ["SqlTest"]
+
+        character_manager.delete_character("SqlTest")
+        with pytest.raises(CharacterNotFoundError):
+            character_manager.load_character("SqlTest")
+    finally:
+        character_manager.set_storage(None)
+        store.close()
+
+def test_async_saves_and_write_behind_queue(tmp_path, monkeypatch):
+    """Test the asyncio save/load API and the write-behind queue"""
+    import asyncio
+    monkeypatch.setattr(character_manager, "SAVE_DIR", str(tmp_path))
+
+    async def scenario():
+        char = character_manager.create_character("AsyncTest", "Warrior")
+        await character_manager.async_save_character(char)
+        loaded = await character_manager.async_load_character("AsyncTest")
+        assert loaded == char
+
+        queue = character_manager.WriteBehindQueue(flush_interval=60)
+        queue.start()
+        char['gold'] = 1
+        queue.enqueue(char)
+        char['gold'] = 2
+        queue.enqueue(char)
+        assert queue.depth == 1
+        await queue.stop()
+
+        stats = queue.stats()
+        assert stats['depth'] == 0
+        assert stats['saved'] == 1
+        return await character_manager.async_load_character("AsyncTest")
+
+    assert asyncio.run(scenario())['gold'] == 2
+
+def test_delta_saves_replay_on_load(tmp_path, monkeypatch):
+    """Test that delta saves only append changes and replay on load"""
+    import save_storage
+    monkeypatch.setattr(character_manager, "SAVE_DIR", str(tmp_path / "dir"))
+    sqlite_store = save_storage.SQLiteStore(str(tmp_path / "saves.db"))
+
+    for store in (None, sqlite_store):
+        character_manager.set_storage(store)
+        try:
+            char = character_manager.create_character("DeltaTest", "Warrior")
+            character_manager.save_character_delta(char)  # first snapshot
+
+            character_manager.add_gold(char, 40)
+            inventory_system.add_item_to_inventory(char, "health_potion")
+            assert char.dirty == {"gold", "inventory"}
+            character_manager.save_character_delta(char)
+            assert char.dirty == set()
+            assert char.delta_count == 1
+
+            loaded = character_manager.load_character("DeltaTest")
+            assert loaded == char
+            assert loaded.delta_count == 1
+
+            character_manager.save_character(char)
+            assert character_manager.load_character("DeltaTest").delta_count == 0
+        finally:
+            character_manager.set_storage(None)
+    sqlite_store.close()
+
+def test_delta_log_survives_torn_tail(tmp_path, monkeypatch):
+    """Test a delta cut off mid-write is dropped instead of failing the load"""
+    monkeypatch.setattr(character_manager, "SAVE_DIR", str(tmp_path))
+    char = character_manager.create_character("Torn", "Rogue")
+    character_manager.save_character(char)
+
+    character_manager.add_gold(char, 10)
+    character_manager.save_character_delta(char)
+    character_manager.add_gold(char, 20)
+    character_manager.save_character_delta(char)
+
+    path = tmp_path / "Torn.delta"
+    path.write_bytes(path.read_bytes()[:-5])
+    loaded = character_manager.load_character("Torn")
+    assert loaded['gold'] == char['gold'] - 20
+
+    # Appending after the torn record still works.
+    character_manager.add_gold(loaded, 5)
+    character_manager.save_character_delta(loaded)
+    assert character_manager.load_character("Torn")['gold'] == loaded['gold']
+
+def test_character_object_mapping_view():
+    """Test that Character works both as attributes and as a mapping"""
+    char = character_manager.create_character("SlotTest", "Warrior")
+
+    assert char.health == char['health'] == 120
+    char['health'] = 50
+    assert char.health == 50
+    assert char.get('equipped_weapon') is None
+
+    char['equipped_weapon'] = 'iron_sword'
+    assert 'equipped_weapon' in char
+    assert list(char)[-1] == 'equipped_weapon'
+    assert dict(char)['class'] == 'Warrior'
+    assert char.dirty == {'health', 'equipped_weapon'}
+
 def test_character_leveling_system():
     """Test that character leveling works correctly"""
     char = character_manager.create_character("LevelTest", "Mage")
@@ -54,6 +248,140 @@ def test_character_leveling_system():
     assert char['max_health'] > original_health
     assert char['health'] == char['max_health']  # Health restored on level up
 
+def test_experience_curve_multi_level():
+    """Test one big XP grant matches many small ones"""
+    big = character_manager.create_character("BigXP", "Warrior")
+    small = character_manager.create_character("SmallXP", "Warrior")
+
+    # Levels 1->2->3->4 cost 100 + 200 + 300 XP.
+    character_manager.gain_experience(big, 650)
+    for _ in range(65):
+        character_manager.gain_experience(small, 10)
+
+    assert big['level'] == small['level'] == 4
+    assert big['experience'] == small['experience'] == 50
+    assert big['max_health'] == small['max_health'] == 150
+
+    character_manager.gain_experience(big, 10 ** 9)
+    assert big['level'] == character_manager.MAX_LEVEL
+
+    corrupt = character_manager.create_character("ZeroLevel", "Warrior")
+    corrupt['level'] = 0
+    character_manager.gain_experience(corrupt, 50)
+    assert corrupt['level'] == 1 and corrupt['experience'] == 50
+
+def test_apply_rewards_reports_failures():
+    """Test bulk rewards skip characters that cannot take them"""
+    import reward_system
+    from custom_exceptions import CharacterDeadError, InventoryFullError
+
+    ok = character_manager.create_character("RaidOk", "Warrior")
+    dead = character_manager.create_character("RaidDead", "Mage")
+    dead['health'] = 0
+    full = character_manager.create_character("RaidFull", "Rogue")
+    full['inventory'] = ['rock'] * inventory_system.MAX_INVENTORY_SIZE
+    solo = character_manager.create_character("Solo", "Warrior")
+
+    rewards = {"xp": 350, "gold": 40, "items": [("health_potion", 2)]}
+    results = reward_system.apply_rewards([ok, dead, full], rewards)
+
+    assert results[0] == {"ok": True, "levels": 2, "error": None}
+    assert isinstance(results[1]["error"], CharacterDeadError)
+    assert isinstance(results[2]["error"], InventoryFullError)
+    assert dead['experience'] == 0 and dead['level'] == 1
+    assert full['level'] == 1
+
+    character_manager.gain_experience(solo, 350)
+    character_manager.add_gold(solo, 40)
+    for key in ('level', 'experience', 'max_health', 'health', 'gold'):
+        assert ok[key] == solo[key]
+    assert inventory_system.count_item(ok, "health_potion") == 2
+
+    from custom_exceptions import InventoryError
+    for bad in ({"health_potion": 0}, {"health_potion": -3}):
+        with pytest.raises(InventoryError):
+            inventory_system.add_items_to_inventory(ok, bad)
+    assert inventory_system.count_item(ok, "health_potion") == 2
+
+def test_character_table_rows_and_export(tmp_path, monkeypatch):
+    """Test the column store round-trips characters and edits in place"""
+    import character_table
+    monkeypatch.setattr(character_manager, "SAVE_DIR", str(tmp_path))
+
+    chars = [character_manager.create_character("Table%d" % i, "Warrior")
+             for i in range(4)]
+    table = character_table.CharacterTable.from_characters(chars)
+    assert len(table) == 4
+    assert [dict(row) for row in table] == [dict(c) for c in chars]
+
+    row = table[2]
+    character_manager.gain_experience(row, 350)
+    inventory_system.add_item_to_inventory(row, "health_potion")
+    assert table.column("level")[2] == 3
+    assert table.top("level", 1) == [2]
+    assert table.total("gold") == sum(c['gold'] for c in chars)
+    assert chars[2]['level'] == 1  # the source dicts are not touched
+
+    assert table.save_all() == 4
+    loaded = character_table.CharacterTable.from_saves(["Table2"])
+    assert loaded.to_character(0) == table.to_character(2)
+
+def test_character_table_rejects_bad_row_without_corrupting():
+    """Test a row with a non-int field leaves every column untouched"""
+    import character_table
+    from custom_exceptions import CharacterError
+    table = character_table.CharacterTable()
+    bad = dict(character_manager.create_character("Bad", "Warrior"))
+    bad['health'] = 12.5
+    with pytest.raises(CharacterError):
+        table.append(bad)
+    assert len(table) == 0
+    assert {len(c) for c in table.columns.values()} == {0}
+
+    good = character_manager.create_character("Good", "Mage")
+    good['level'] = 4
+    assert table.append(good) == 0
+    assert {len(c) for c in table.columns.values()} == {1}
+    assert table[0]['level'] == 4
+    assert dict(table[0]) == dict(good)
+
+def test_regen_scheduler_heals_live_characters():
+    """Test regen ticks heal live characters up to max and skip the dead"""
+    import character_table
+    chars = [character_manager.create_character("Regen%d" % i, "Mage")
+             for i in range(3)]
+    chars[0]['health'] = 78
+    chars[1]['health'] = 0
+    chars[2]['health'] = 10
+    table = character_table.CharacterTable.from_characters(chars)
+
+    regen = character_manager.RegenScheduler(5)
+    regen.add(chars)
+    regen.add(table)
+    assert regen.tick() == 4
+
+    for population in (chars, table):
+        assert [c['health'] for c in population] == [80, 0, 15]
+    stats = regen.stats()
+    assert stats['ticks'] == 1
+    assert stats['last_size'] == 6
+    assert stats['last_tick_seconds'] >= 0
+
+def test_character_copy_is_independent():
+    """Test copies of a Character do not share extra keys or dirty state"""
+    import copy
+    char = character_manager.create_character("CopyTest", "Warrior")
+    char['equipped_weapon'] = "iron_sword"
+    char.mark_saved()
+
+    for clone in (char.copy(), copy.copy(char)):
+        assert clone == char
+        clone['equipped_weapon'] = "steel_sword"
+        clone['gold'] = 1
+        assert char['equipped_weapon'] == "iron_sword"
+        assert char.dirty == set()
+        assert clone.dirty == {'equipped_weapon', 'gold'}
+
 def test_character_gold_management():
     """Test adding and spending gold"""
     char = character_manager.create_character("GoldTest", "Rogue")
@@ -89,6 +417,43 @@ def test_inventory_item_management():
     assert "health_potion" not in char['inventory']  # Consumed
     assert char['health'] == 70  # Healed
 
+def test_inventory_rejects_bad_quantities():
+    """Test empty or negative stacks cannot be created"""
+    from custom_exceptions import ItemNotFoundError
+    inv = inventory_system.Inventory()
+    for quantity in (0, -1, 1.5):
+        with pytest.raises(ValueError):
+            inv.add("x", quantity)
+        with pytest.raises(ValueError):
+            inv.remove("x", quantity)
+    assert "x" not in inv and len(inv) == 0
+
+    char = character_manager.create_character("QtyTest", "Rogue")
+    char['inventory'] = inv
+    with pytest.raises(ItemNotFoundError):
+        inventory_system.remove_item_from_inventory(char, "x")
+
+def test_stacked_inventory_keeps_list_semantics():
+    """Test stacked inventory counts, capacity and save compatibility"""
+    char = character_manager.create_character("StackTest", "Rogue")
+    char['inventory'] = ['health_potion', 'iron_sword', 'health_potion']
+
+    assert inventory_system.count_item(char, 'health_potion') == 2
+    inventory_system.remove_item_from_inventory(char, 'health_potion')
+    assert inventory_system.count_item(char, 'health_potion') == 1
+    assert len(char['inventory']) == 2
+
+    for _ in range(inventory_system.MAX_INVENTORY_SIZE - 2):
+        inventory_system.add_item_to_inventory(char, 'health_potion')
+    from custom_exceptions import InventoryFullError
+    with pytest.raises(InventoryFullError):
+        inventory_system.add_item_to_inventory(char, 'iron_sword')
+
+    data = character_manager.encode_character(char)
+    loaded = character_manager.decode_character(data)
+    assert isinstance(loaded['inventory'], list)
+    assert sorted(loaded['inventory']) == sorted(char['inventory'])
+
 def test_equipment_system():
     """Test equipping weapons and armor"""
     char = character_manager.create_character("EquipTest", "Warrior")
@@ -104,6 +469,25 @@ def test_equipment_system():
     assert 'equipped_weapon' in char
     assert char['equipped_weapon'] == "iron_sword"
 
+def test_compiled_item_effects():
+    """Test that loaded items carry compiled effects that get applied"""
+    items = game_data.load_items("data/items.txt")
+    assert items['health_potion']['effects'] == (('health', 'add', 20),)
+    assert game_data.parse_effect("health:10,magic:=3,bad:x") == (
+        ('health', 'add', 10), ('magic', 'set', 3)
+    )
+
+    char = character_manager.create_character("EffectTest", "Mage")
+    original_magic = char['magic']
+    inventory_system.add_item_to_inventory(char, "fire_staff")
+    inventory_system.equip_weapon(char, "fire_staff", items['fire_staff'])
+    assert char['magic'] == original_magic + 8
+
+    # Armor only checks the item; it has no effect yet.
+    inventory_system.add_item_to_inventory(char, "leather_armor")
+    inventory_system.equip_armor(char, "leather_armor", items['leather_armor'])
+    assert char['max_health'] == 80
+
 def test_shop_system():
     """Test buying and selling items"""
     char = character_manager.create_character("ShopTest", "Mage")
@@ -123,6 +507,35 @@ def test_shop_system():
     assert gold_received == 12  # Half of cost (25 // 2)
     assert "health_potion" not in char['inventory']
 
+def test_batch_shop_is_all_or_nothing():
+    """Test basket purchases and sales apply fully or not at all"""
+    from custom_exceptions import InventoryFullError, ItemNotFoundError
+    items = game_data.load_items("data/items.txt")
+    char = character_manager.create_character("BasketTest", "Warrior")
+    char['gold'] = 10000
+
+    spent = inventory_system.purchase_items(
+        char, [('health_potion', 3), ('iron_sword', 1)], items
+    )
+    assert spent == 3 * 25 + 100
+    assert char['gold'] == 10000 - spent
+    assert inventory_system.count_item(char, 'health_potion') == 3
+
+    with pytest.raises(InventoryFullError):
+        inventory_system.purchase_items(char, [('health_potion', 50)], items)
+    assert char['gold'] == 10000 - spent
+    assert len(char['inventory']) == 4
+
+    with pytest.raises(ItemNotFoundError):
+        inventory_system.sell_items(
+            char, [('health_potion', 1), ('steel_sword', 1)], items
+        )
+    assert inventory_system.count_item(char, 'health_potion') == 3
+
+    received = inventory_system.sell_items(char, [('health_potion', 2)], items)
+    assert received == 2 * 12
+    assert inventory_system.count_item(char, 'health_potion') == 1
+
 # ============================================================================
 # QUEST INTEGRATION TESTS
 # ============================================================================
@@ -187,6 +600,64 @@ def test_quest_prerequisite_system():
     quest_handler.accept_quest(char, 'second_quest', quests)
     assert 'second_quest' in char['active_quests']
 
+def test_quest_log_keeps_order_and_saves_as_list():
+    """Test quest lists become ordered sets that still save as lists"""
+    quests = game_data.load_quests("data/quests.txt")
+    char = character_manager.create_character("QuestLogTest", "Cleric")
+    char['completed_quests'] = ['first_steps', 'goblin_hunter']
+    char['level'] = 3
+
+    quest_handler.accept_quest(char, 'orc_menace', quests)
+    quest_handler.accept_quest(char, 'equipment_upgrade', quests)
+    quest_handler.abandon_quest(char, 'orc_menace')
+    quest_handler.complete_quest(char, 'equipment_upgrade', quests)
+
+    assert isinstance(char['completed_quests'], quest_handler.QuestLog)
+    assert char['completed_quests'] == [
+        'first_steps', 'goblin_hunter', 'equipment_upgrade'
+    ]
+    assert char['active_quests'] == []
+
+    data = character_manager.encode_character(char)
+    loaded = character_manager.decode_character(data)
+    assert loaded['completed_quests'] == [
+        'first_steps', 'goblin_hunter', 'equipment_upgrade'
+    ]
+
+def test_quest_board_tracks_availability():
+    """Test the quest board matches a full scan as the character progresses"""
+    quests = game_data.load_quests("data/quests.txt")
+    index = quest_handler.QuestIndex(quests)
+    char = character_manager.create_character("BoardTest", "Mage")
+    board = quest_handler.QuestBoard(index, char)
+
+    def expected():
+        return set(quest_handler.get_available_quests(char, quests))
+
+    assert set(board.available()) == expected() == {'first_steps'}
+
+    board.accept('first_steps')
+    assert board.available() == []
+    board.complete('first_steps')
+    assert set(board.available()) == expected()
+    assert 'goblin_hunter' not in board.available()
+
+    char['level'] = 2
+    assert set(board.available()) == expected()
+    assert 'goblin_hunter' in board.available()
+
+    board.accept('goblin_hunter')
+    board.abandon('goblin_hunter')
+    assert set(board.available()) == expected()
+
+    char['level'] = 10
+    for _ in range(len(quests)):
+        for quest_id in board.available():
+            board.accept(quest_id)
+            board.complete(quest_id)
+        assert set(board.available()) == expected()
+    assert set(char['completed_quests']) == set(quests)
+
 # ============================================================================
 # COMBAT INTEGRATION TESTS
 # ============================================================================
@@ -204,6 +675,33 @@ def test_combat_system_basic_battle():
     assert battle.character == char
     assert battle.enemy == enemy
 
+def test_enemy_flyweight_and_pool():
+    """Test enemies share templates and defeated ones are recycled"""
+    first = combat_system.create_enemy("goblin")
+    second = combat_system.create_enemy("goblin")
+    assert first.template is second.template
+    first['health'] = 1
+    assert second['health'] == 30
+    assert dict(first) == {'name': 'Goblin', 'health': 1,
+                           'xp_reward': 20, 'gold_reward': 10}
+
+    pool = combat_system.EnemyPool()
+    enemy = pool.acquire("goblin")
+    char = character_manager.create_character("PoolTest", "Warrior")
+    battle = combat_system.SimpleBattle(char, enemy, pool)
+    while battle.combat_active:
+        battle.player_turn()
+    assert combat_system.get_victory_rewards(enemy)['xp'] == 20
+    pool.release(enemy)  # already released by the battle
+
+    again = pool.acquire("goblin")
+    assert again is enemy
+    assert again['health'] == 30
+    assert (pool.created, pool.reused) == (1, 1)
+    assert pool.acquire("goblin") is not again
+    pool.release(again)
+    assert pool.acquire("goblin") is again
+
 def test_combat_victory_rewards():
     """Test that winning combat grants rewards"""
     char = character_manager.create_character("RewardTest", "Mage")
@@ -222,6 +720,104 @@ def test_combat_victory_rewards():
     assert rewards['xp'] == expected_xp
     assert rewards['gold'] == expected_gold
 
+def _fight_to_the_end(char, enemy):
+    battle = combat_system.SimpleBattle(char, enemy)
+    turns = 0
+    while battle.combat_active:
+        turns += 1
+        battle.player_turn()
+        if battle.combat_active:
+            battle.enemy_turn()
+    return turns
+
+def test_simulate_battles_matches_simple_battle():
+    """Test batch simulation against turn-by-turn SimpleBattle"""
+    chars = [character_manager.create_character("Sim%d" % i, cls)
+             for i, cls in enumerate(["Warrior", "Mage", "Rogue", "Cleric"])]
+    chars[1]['health'] = 12
+    enemies = [combat_system.create_enemy(t)
+               for t in ("goblin", "dragon", "orc", "dragon")]
+
+    results = combat_system.simulate_battles(chars, enemies)
+
+    for char, enemy, result in zip(chars, enemies, results):
+        char_copy, enemy_copy = dict(char), dict(enemy)
+        turns = _fight_to_the_end(char_copy, enemy_copy)
+        assert result['turns'] == turns
+        assert result['character_health'] == char_copy['health']
+        assert result['enemy_health'] == enemy_copy['health']
+        assert result['won'] == (enemy_copy['health'] == 0)
+        if result['won']:
+            assert result['rewards'] == combat_system.get_victory_rewards(enemy)
+    assert results[1]['won'] == False
+
+def test_resolve_battle_fast_matches_turn_loop():
+    """Test the closed-form battle result against the turn loop"""
+    class LoopBattle(combat_system.SimpleBattle):
+        pass
+
+    for enemy_type, health in (("goblin", 120), ("dragon", 40), ("orc", 3)):
+        fast_char = character_manager.create_character("Fast", "Rogue")
+        loop_char = character_manager.create_character("Loop", "Rogue")
+        fast_char['health'] = loop_char['health'] = health
+        fast_enemy = combat_system.create_enemy(enemy_type)
+        loop_enemy = combat_system.create_enemy(enemy_type)
+
+        fast = combat_system.resolve_battle_fast(fast_char, fast_enemy)
+        loop = combat_system.resolve_battle_fast(loop_char, loop_enemy, LoopBattle)
+
+        assert fast == loop
+        assert fast_enemy == loop_enemy
+        for key in ('health', 'experience', 'gold', 'level'):
+            assert fast_char[key] == loop_char[key]
+
+def test_battle_scheduler_process_pool():
+    """Test pooled battles match running them one after another"""
+    import copy
+    chars = [character_manager.create_character("Pool%d" % i, "Warrior")
+             for i in range(3)]
+    expected_chars = copy.deepcopy(chars)
+    jobs = [(chars[i % 3], t) for i, t in
+            enumerate(["goblin", "orc", "dragon", "goblin", "goblin", "orc"])]
+
+    expected = [
+        combat_system.resolve_battle_fast(
+            expected_chars[i % 3], combat_system.create_enemy(t))
+        for i, (_, t) in enumerate(jobs)
+    ]
+
+    with combat_system.BattleScheduler(max_workers=2, chunk_size=2,
+                                       inline_threshold=0) as scheduler:
+        assert scheduler.run(jobs) == expected
+
+    for char, expected_char in zip(chars, expected_chars):
+        assert char == expected_char
+
+def test_battle_scheduler_uses_current_catalog():
+    """Test workers fight the parent's catalog after a hot swap"""
+    catalog = dict(combat_system.get_enemy_types())
+    try:
+        with combat_system.BattleScheduler(max_workers=2,
+                                           inline_threshold=0) as scheduler:
+            char = character_manager.create_character("Swap", "Warrior")
+            scheduler.run([(char, "goblin")] * 4)
+
+            swapped = dict(catalog)
+            swapped['goblin'] = dict(catalog['goblin'], gold_reward=999)
+            swapped['boss'] = {'name': 'Boss', 'health': 5,
+                               'xp_reward': 1, 'gold_reward': 2}
+            combat_system.set_enemy_types(swapped)
+
+            fresh = [character_manager.create_character("Swap%d" % i, "Warrior")
+                     for i in range(4)]
+            results = scheduler.run(
+                [(c, t) for c, t in zip(fresh, ["goblin", "boss"] * 2)]
+            )
+    finally:
+        combat_system.set_enemy_types(None)
+
+    assert [r['rewards']['gold'] for r in results] == [999, 2, 999, 2]
+
 # ============================================================================
 # DATA LOADING INTEGRATION TESTS
 # ============================================================================
@@ -249,6 +845,181 @@ def test_load_game_data():
         assert 'type' in item
         assert 'cost' in item
 
+def test_load_enemies_feeds_combat():
+    """Test that enemies come from data/enemies.txt"""
+    enemies = game_data.load_enemies("data/enemies.txt")
+    assert enemies['goblin'] == {'enemy_id': 'goblin', 'name': 'Goblin',
+                                 'health': 30, 'xp_reward': 20,
+                                 'gold_reward': 10}
+    for enemy in enemies.values():
+        assert game_data.validate_enemy_data(enemy) == True
+    assert set(combat_system.get_enemy_types()) == set(enemies)
+    assert combat_system.ENEMY_TYPES == combat_system.get_enemy_types()
+    assert combat_system.ENEMY_TYPES['goblin']['health'] == 30
+
+    from custom_exceptions import InvalidDataFormatError
+    with pytest.raises(InvalidDataFormatError):
+        game_data.validate_enemy_data(dict(enemies['orc'], health=0))
+
+def test_block_reader_small_chunks(tmp_path, monkeypatch):
+    """Test block splitting when separators straddle read chunks"""
+    def quest(qid):
+        return ("QUEST_ID: %s\nTITLE: T\nDESCRIPTION: D\nREWARD_XP: 10\n"
+                "REWARD_GOLD: 5\nREQUIRED_LEVEL: 1\nPREREQUISITE: NONE" % qid)
+
+    expected = {
+        qid: {'quest_id': qid, 'title': 'T', 'description': 'D',
+              'reward_xp': 10, 'reward_gold': 5, 'required_level': 1,
+              'prerequisite': 'NONE'}
+        for qid in ("a", "b", "c")
+    }
+    inputs = {
+        "plain": quest("a") + "\n\n" + quest("b") + "\n\n" + quest("c") + "\n",
+        "whitespace": quest("a") + "\n  \n\t\n" + quest("b") + "\n \n" + quest("c"),
+        "crlf": (quest("a") + "\n\n" + quest("b") + "\n\n" + quest("c")
+                 ).replace("\n", "\r\n") + "\r\n",
+        "no_trailing_newline": "\n\n" + quest("a") + "\n\n" + quest("b")
+                               + "\n\n" + quest("c"),
+    }
+    path = tmp_path / "quests.txt"
+    for chunk_size in (1, 2, 3, 7, 64):
+        monkeypatch.setattr(game_data, "_READ_CHUNK_SIZE", chunk_size)
+        for name, text in inputs.items():
+            path.write_bytes(text.encode("utf-8"))
+            loaded = game_data.load_quests(str(path), use_cache=False)
+            assert loaded == expected, (name, chunk_size)
+
+def test_content_cache_rebuilds_on_change(tmp_path, monkeypatch):
+    """Test that the compiled content cache is used and invalidated"""
+    path = tmp_path / "quests.txt"
+    block = (
+        "QUEST_ID: {qid}\nTITLE: T\nDESCRIPTION: D\nREWARD_XP: 10\n"
+        "REWARD_GOLD: 5\nREQUIRED_LEVEL: 1\nPREREQUISITE: NONE\n"
+    )
+    path.write_text(block.format(qid="one"))
+
+    first = game_data.load_quests(str(path))
+    assert os.path.exists(str(path) + game_data.CACHE_SUFFIX)
+    assert game_data.load_quests(str(path)) == first
+
+    replaced = []
+    real_replace = os.replace
+    def replace(src, dst):
+        replaced.append(src)
+        real_replace(src, dst)
+    monkeypatch.setattr(os, "replace", replace)
+
+    path.write_text(block.format(qid="one") + "\n" + block.format(qid="two"))
+    assert set(game_data.load_quests(str(path))) == {"one", "two"}
+    # Each process writes its own temp file before swapping it in.
+    assert str(os.getpid()) in replaced[0]
+
+def test_content_cache_survives_corruption(tmp_path, monkeypatch):
+    """Test that a damaged cache or a same-stamp edit falls back to parsing"""
+    path = tmp_path / "quests.txt"
+    block = (
+        "QUEST_ID: {qid}\nTITLE: T\nDESCRIPTION: D\nREWARD_XP: 10\n"
+        "REWARD_GOLD: 5\nREQUIRED_LEVEL: 1\nPREREQUISITE: NONE\n"
+    )
+    path.write_text(block.format(qid="one"))
+    expected = game_data.load_quests(str(path))
+    cache_path = str(path) + game_data.CACHE_SUFFIX
+    good = open(cache_path, "rb").read()
+
+    for i in range(0, len(good), 7):
+        damaged = bytearray(good)
+        damaged[i] ^= 0xFF
+        with open(cache_path, "wb") as f:
+            f.write(damaged)
+        assert game_data.load_quests(str(path)) == expected, i
+
+    # A payload that passes the digest but fails to unpickle oddly.
+    def explode(data):
+        raise MemoryError()
+    with monkeypatch.context() as m:
+        m.setattr(game_data.pickle, "loads", explode)
+        assert game_data.load_quests(str(path)) == expected
+
+    # Same size and mtime, different content: the hash still catches it.
+    stat = os.stat(path)
+    path.write_text(block.format(qid="two"))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert set(game_data.load_quests(str(path))) == {"two"}
+
+def test_lazy_catalog_matches_loaders():
+    """Test that lazy catalogs expose the same records as the loaders"""
+    quests = game_data.open_quest_catalog("data/quests.txt")
+    items = game_data.open_item_catalog("data/items.txt")
+
+    assert dict(quests) == game_data.load_quests("data/quests.txt")
+    assert dict(items) == game_data.load_items("data/items.txt")
+    assert 'health_potion' in items
+    assert 'missing_item' not in items
+
+    char = character_manager.create_character("LazyTest", "Warrior")
+    quest_handler.accept_quest(char, 'first_steps', quests)
+    assert 'first_steps' in char['active_quests']
+
+    quests.close()
+    items.close()
+
+def test_lazy_catalog_ignores_later_file_edits(tmp_path):
+    """Test an open lazy catalog keeps its records when the file changes"""
+    path = tmp_path / "quests.txt"
+    original = open("data/quests.txt").read()
+    path.write_text(original)
+    quests = game_data.open_quest_catalog(str(path))
+    expected = game_data.load_quests("data/quests.txt")
+
+    # Rewrite in place with shifted offsets, then truncate.
+    path.write_text("\n\n\n" + original.replace("QUEST_ID", "QUEST_ID "))
+    first = next(iter(quests))
+    assert quests[first] == expected[first]
+    with open(path, "r+") as f:
+        f.truncate(0)
+    assert dict(quests) == expected
+
+def test_live_catalog_hot_reload(tmp_path, monkeypatch):
+    """Test that a watched catalog picks up edits and survives bad ones"""
+    path = tmp_path / "quests.txt"
+    block = (
+        "QUEST_ID: {qid}\nTITLE: {title}\nDESCRIPTION: D\nREWARD_XP: 10\n"
+        "REWARD_GOLD: 5\nREQUIRED_LEVEL: 1\nPREREQUISITE: NONE\n"
+    )
+    path.write_text(block.format(qid="one", title="T"))
+    game_data.load_quests(str(path))
+
+    # The first load is served from the compiled cache.
+    def no_parse(f):
+        raise AssertionError("parsed the source instead of the cache")
+    with monkeypatch.context() as m:
+        m.setattr(game_data, "_iter_blocks", no_parse)
+        quests = game_data.LiveCatalog(
+            str(path), game_data.QUEST_SCHEMA, game_data.validate_quest_data
+        )
+    watcher = game_data.CatalogWatcher()
+    reloaded = []
+    watcher.add(quests, on_reload=reloaded.append)
+    assert watcher.poll() == []
+
+    unchanged = quests['one']
+    path.write_text(
+        block.format(qid="one", title="T") + "\n"
+        + block.format(qid="two", title="New")
+    )
+    assert watcher.poll() == [quests]
+    assert reloaded == [quests]
+    assert set(quests) == {"one", "two"}
+    assert quests['one'] is unchanged
+
+    char = character_manager.create_character("LiveTest", "Warrior")
+    quest_handler.accept_quest(char, 'two', quests)
+
+    path.write_text("not a quest file\n")
+    assert watcher.poll() == []
+    assert quests.last_error is not None
+    assert set(quests) == {"one", "two"}
+
 def test_data_validation():
     """Test that data validation works"""
     valid_quest = {
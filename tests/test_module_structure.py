@@ -40,6 +40,16 @@ def test_combat_system_module_exists():
     import combat_system
     assert combat_system is not None
 
+def test_character_table_module_exists():
+    """Test that character_table module can be imported"""
+    import character_table
+    assert character_table is not None
+
+def test_reward_system_module_exists():
+    """Test that reward_system module can be imported"""
+    import reward_system
+    assert reward_system is not None
+
 def test_main_module_exists():
     """Test that main module can be imported"""
     import main